@@ -0,0 +1,235 @@
+import os, sys, json, random, time, argparse, platform
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+# before pygame and the game modules, see game_env
+from game_env import from_start_dir
+
+import pygame, settings
+from settings import *
+
+DT = 1 / 60
+STAGES = ['custom_draw', 'all_sprites.update', 'plant_collision', 'Rain.update', 'Sky.display']
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.frame = {}
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.frame[name] = self.frame.get(name, 0) + time.perf_counter() - start
+            return result
+        return timed
+
+    def end_frame(self):
+        for name, value in self.frame.items():
+            self.samples.setdefault(name, []).append(value)
+        self.frame = {}
+
+    def instrument(self, level):
+        level.all_sprites.custom_draw = self.wrap('custom_draw', level.all_sprites.custom_draw)
+        level.all_sprites.update = self.wrap('all_sprites.update', level.all_sprites.update)
+        level.plant_collision = self.wrap('plant_collision', level.plant_collision)
+        level.rain.update = self.wrap('Rain.update', level.rain.update)
+        # the sky colour update and the tint blend together replace Sky.display
+        level.sky.update = self.wrap('Sky.display', level.sky.update)
+        level.tint.display = self.wrap('Sky.display', level.tint.display)
+
+def summarize(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    def percentile(value):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * value))]
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p95_ms': percentile(0.95) * 1000,
+        'p99_ms': percentile(0.99) * 1000
+    }
+
+def create_level(seed, map_path, load_path):
+    from level import Level
+    from save import read_save, restore
+    random.seed(seed)
+    start = time.perf_counter()
+    level = Level(save_path = None, map_path = map_path)
+    if load_path:
+        state = read_save(load_path)
+        if state is None:
+            raise SystemExit(f'could not read save {load_path}')
+        restore(level, state)
+    return level, time.perf_counter() - start
+
+def run_frames(level, timer, frames):
+    for _ in range(frames):
+        pygame.event.pump()
+        start = time.perf_counter()
+        level.run(DT)
+        timer.frame['frame'] = time.perf_counter() - start
+        timer.end_frame()
+
+# scenarios
+def idle(level, timer, frames):
+    level.raining = False
+    run_frames(level, timer, frames)
+
+def farm(level, timer, frames, tiles = 1000):
+    # turn a block of tiles around the player into a planted, watered field
+    soil_layer = level.soil_layer
+    grid = soil_layer.grid
+    columns = 40
+    left = max(0, level.player.rect.centerx // TILE_SIZE - columns // 2)
+    top = max(0, level.player.rect.centery // TILE_SIZE - tiles // columns // 2)
+    for index in range(tiles):
+        col = min(grid.width - 1, left + index % columns)
+        row = min(grid.height - 1, top + index // columns)
+        grid.set(col, row, FARMABLE)
+        point = (col * TILE_SIZE + TILE_SIZE // 2, row * TILE_SIZE + TILE_SIZE // 2)
+        soil_layer.get_hit(point)
+        soil_layer.plant_seed(point, ('corn', 'tomato')[index % 2])
+    soil_layer.water_all()
+    soil_layer.update_plants()
+    level.raining = False
+    run_frames(level, timer, frames)
+
+def rain(level, timer, frames):
+    level.raining = True
+    run_frames(level, timer, frames)
+
+def shop(level, timer, frames):
+    level.raining = False
+    level.shop_active = True
+    run_frames(level, timer, frames)
+
+def rollover(level, timer, frames):
+    farm(level, timer, 0)
+    for _ in range(frames):
+        start = time.perf_counter()
+        level.reset()
+        timer.frame['Level.reset'] = time.perf_counter() - start
+        timer.end_frame()
+
+def save_load(level, timer, frames):
+    from save import snapshot, decode, restore
+    farm(level, timer, 0)
+    for _ in range(frames):
+        start = time.perf_counter()
+        payload = snapshot(level)
+        timer.frame['snapshot'] = time.perf_counter() - start
+        start = time.perf_counter()
+        restore(level, decode(payload))
+        timer.frame['restore'] = time.perf_counter() - start
+        timer.end_frame()
+
+SCENARIOS = {
+    'idle': (idle, 600),
+    'farm_1000': (farm, 600),
+    'rain_60s': (rain, int(60 / DT)),
+    'shop': (shop, 600),
+    'day_rollover': (rollover, 30),
+    'save_load': (save_load, 30)
+}
+
+def run(names, seed, scale, map_path = MAP_PATH, load_path = None):
+    # support re-exports the settings it saw at import, so it waits for the command line too
+    from support import assets, text_cache
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    # sound decoding is not what we measure and depends on the audio device
+    assets.audio = False
+
+    results = {'startup': {}, 'scenarios': {}}
+    for name in names:
+        scenario, frames = SCENARIOS[name]
+        level, startup = create_level(seed, map_path, load_path)
+        results['startup'].setdefault('cold_s' if not results['startup'] else 'warm_s', startup)
+
+        timer = StageTimer()
+        timer.instrument(level)
+        random.seed(seed)
+        scenario(level, timer, max(1, int(frames * scale)))
+        results['scenarios'][name] = {stage: summarize(samples)
+                                      for stage, samples in timer.samples.items() if samples}
+    # over every scenario, the cache is shared by the levels the run creates
+    results['caches'] = {'assets': assets.stats(), 'text': text_cache.stats()}
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, stages in results['scenarios'].items():
+        for stage, stats in stages.items():
+            base = baseline.get('scenarios', {}).get(name, {}).get(stage)
+            if not base:
+                continue
+            for key in ('mean_ms', 'p95_ms'):
+                if stats[key] > base[key] * (1 + tolerance):
+                    regressions.append(f'{name} {stage} {key}: {base[key]:.3f} -> {stats[key]:.3f}')
+    return regressions
+
+def print_results(results):
+    for key, value in results['startup'].items():
+        print(f'startup {key}: {value:.3f}')
+    for name, stages in results['scenarios'].items():
+        print(name)
+        for stage, stats in stages.items():
+            print(f'  {stage:<20} mean {stats["mean_ms"]:8.3f}ms  p95 {stats["p95_ms"]:8.3f}ms'
+                  f'  p99 {stats["p99_ms"]:8.3f}ms  ({stats["count"]})')
+    for name, stats in results.get('caches', {}).items():
+        size = f', {stats["bytes"] / 2**20:.1f} MB' if 'bytes' in stats else ''
+        print(f'{name} cache: {stats["hit rate"]:.1%} hits of {stats["hits"] + stats["misses"]} lookups, '
+              f'{stats["entries"]} entries{size}')
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Farm Game frame and subsystem benchmarks')
+    parser.add_argument('scenarios', nargs = '*', default = list(SCENARIOS),
+                        help = f'scenarios to run, any of {", ".join(SCENARIOS)}')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--scale', type = float, default = 1, help = 'multiplier for frame counts')
+    parser.add_argument('--map', help = 'TMX map to run on, e.g. one made by tools/generate_map.py')
+    parser.add_argument('--load', help = 'save file to restore before every scenario')
+    parser.add_argument('--streaming', action = 'store_true', help = 'run with WORLD_STREAMING on')
+    parser.add_argument('--output', help = 'write the results as JSON to this file')
+    parser.add_argument('--baseline', help = 'JSON results to compare against')
+    parser.add_argument('--tolerance', type = float, default = 0.1,
+                        help = 'allowed slowdown against the baseline, 0.1 is 10%%')
+    args = parser.parse_args()
+
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f'unknown scenario {name}')
+
+    # the game modules are imported per scenario, after this
+    settings.WORLD_STREAMING = settings.WORLD_STREAMING or args.streaming
+
+    results = run(args.scenarios, args.seed, args.scale, from_start_dir(args.map) or MAP_PATH,
+                  from_start_dir(args.load))
+    results['meta'] = {
+        'seed': args.seed,
+        'scale': args.scale,
+        'map': args.map,
+        'load': args.load,
+        'streaming': settings.WORLD_STREAMING,
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    print_results(results)
+
+    if args.output:
+        with open(from_start_dir(args.output), 'w') as file:
+            json.dump(results, file, indent = 2)
+
+    if args.baseline:
+        with open(from_start_dir(args.baseline)) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
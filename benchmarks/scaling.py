@@ -0,0 +1,61 @@
+import os, sys, json, argparse, subprocess, tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+GENERATOR = os.path.join(ROOT, 'tools', 'generate_map.py')
+RUNNER = os.path.join(ROOT, 'benchmarks', 'run.py')
+
+def generate(folder, scale, planted, seed):
+    subprocess.run([sys.executable, GENERATOR, folder, '--scale', str(scale), '--planted', str(planted),
+                    '--seed', str(seed)], check = True, stdout = subprocess.DEVNULL)
+
+def measure(folder, scenario, frames_scale, streaming, seed):
+    with tempfile.TemporaryDirectory() as temp:
+        output = os.path.join(temp, 'results.json')
+        command = [sys.executable, RUNNER, scenario, '--map', os.path.join(folder, 'map.tmx'),
+                   '--load', os.path.join(folder, 'farm.sav'), '--scale', str(frames_scale),
+                   '--seed', str(seed), '--output', output]
+        if streaming:
+            command.append('--streaming')
+        # every point in its own process, caches and sprite counts don't leak between sizes
+        subprocess.run(command, check = True, stdout = subprocess.DEVNULL)
+        with open(output) as file:
+            return json.load(file)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Frame time and startup against world size')
+    parser.add_argument('--scales', default = '1,2,5,10',
+                        help = 'comma separated map areas relative to the hand made map')
+    parser.add_argument('--scenario', default = 'idle', help = 'benchmarks/run.py scenario to time')
+    parser.add_argument('--planted', type = float, default = 0.05,
+                        help = 'planted tiles per map tile in the generated saves')
+    parser.add_argument('--frames-scale', type = float, default = 0.5,
+                        help = 'multiplier for the scenario frame count')
+    parser.add_argument('--streaming', action = 'store_true', help = 'run with WORLD_STREAMING on')
+    parser.add_argument('--maps', default = os.path.join(tempfile.gettempdir(), 'farm_scaling'),
+                        help = 'folder for the generated maps, reused between runs')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--output', help = 'write the curve as JSON to this file')
+    args = parser.parse_args()
+
+    points = []
+    print(f'{"scale":>6} {"tiles":>8} {"startup s":>10} {"frame ms":>9} {"p95 ms":>8}')
+    for scale in [float(value) for value in args.scales.split(',')]:
+        folder = os.path.join(args.maps, f'scale_{scale:g}')
+        tiles = round(50 * scale ** 0.5) * round(40 * scale ** 0.5)
+        if not os.path.exists(os.path.join(folder, 'farm.sav')):
+            generate(folder, scale, int(tiles * args.planted), args.seed)
+        results = measure(folder, args.scenario, args.frames_scale, args.streaming, args.seed)
+        frame = results['scenarios'][args.scenario]['frame']
+        point = {'scale': scale, 'tiles': tiles, 'startup_s': results['startup']['cold_s'],
+                 'frame_mean_ms': frame['mean_ms'], 'frame_p95_ms': frame['p95_ms']}
+        points.append(point)
+        print(f'{scale:>6g} {tiles:>8} {point["startup_s"]:>10.3f} {point["frame_mean_ms"]:>9.3f}'
+              f' {point["frame_p95_ms"]:>8.3f}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'scenario': args.scenario, 'streaming': args.streaming, 'points': points},
+                      file, indent = 2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+class AnimationClock:
+    def __init__(self, frames, speed):
+        self.frames = frames
+        self.speed = speed
+        self.time = 0
+        # set by sprites when the camera reads their image, cleared on every advance
+        self.visible = True
+
+    def advance(self, dt):
+        # nothing using the clock was drawn last frame, hold it where it is
+        if not self.visible:
+            return
+        self.visible = False
+        self.time += self.speed * dt
+        if self.time >= len(self.frames):
+            self.time = 0
+
+    def frame(self, phase = 0):
+        return self.frames[int(self.time + phase) % len(self.frames)]
+
+class AnimationClocks:
+    def __init__(self):
+        self.clocks = {}
+
+    def get(self, frames, speed):
+        # sprites showing the same frames at the same speed share one clock
+        key = (tuple(id(frame) for frame in frames), speed)
+        if key not in self.clocks:
+            self.clocks[key] = AnimationClock(frames, speed)
+        return self.clocks[key]
+
+    def advance(self, dt):
+        for clock in self.clocks.values():
+            clock.advance(dt)
+
+clocks = AnimationClocks()
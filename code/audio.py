@@ -0,0 +1,75 @@
+import pygame
+from settings import *
+from support import assets
+from timer import scheduler
+
+class NullAudio:
+    # headless runs and benchmarks, nothing is loaded or played
+    def play(self, name):
+        pass
+
+    def play_music(self, path = MUSIC_PATH, loops = 0):
+        pass
+
+    def stop_music(self):
+        pass
+
+class MixerAudio:
+    def __init__(self, sounds = SOUNDS):
+        # every effect gets its own channels, the rest of the mixer never plays over them
+        total = sum(voices for _, voices, _ in sounds.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total))
+        pygame.mixer.set_reserved(total)
+
+        self.sounds = {}
+        self.channels = {}
+        self.min_gap = {}
+        first = 0
+        for name, (path, voices, min_gap) in sounds.items():
+            self.sounds[name] = assets.sound(path)
+            self.channels[name] = [pygame.mixer.Channel(index) for index in range(first, first + voices)]
+            self.min_gap[name] = min_gap
+            first += voices
+
+        self.next_channel = {name: 0 for name in sounds}
+        self.last_played = {}
+
+    def play(self, name):
+        now = scheduler.get_ticks()
+        if name in self.last_played and now - self.last_played[name] < self.min_gap[name]:
+            return
+        self.last_played[name] = now
+
+        # round robin over the reserved channels, the next one is the longest playing
+        channels = self.channels[name]
+        index = self.next_channel[name]
+        self.next_channel[name] = (index + 1) % len(channels)
+        channels[index].play(self.sounds[name])
+
+    def play_music(self, path = MUSIC_PATH, loops = 0):
+        pygame.mixer.music.load(path)
+        pygame.mixer.music.play(loops)
+
+    def stop_music(self):
+        pygame.mixer.music.stop()
+
+class Audio:
+    # shared by everything that makes a sound, the backend is picked on first use
+    def __init__(self):
+        self.backend = None
+
+    def get_backend(self):
+        if self.backend is None:
+            self.backend = MixerAudio() if assets.audio and pygame.mixer.get_init() else NullAudio()
+        return self.backend
+
+    def play(self, name):
+        self.get_backend().play(name)
+
+    def play_music(self, path = MUSIC_PATH, loops = 0):
+        self.get_backend().play_music(path, loops)
+
+    def stop_music(self):
+        self.get_backend().stop_music()
+
+audio = Audio()
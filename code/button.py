@@ -1,12 +1,14 @@
 import pygame
+from support import render_text
 
 class Button:
 	def __init__(self, image, pos, text_input, font, base_color, hovering_color):
-		self.image = image if image is not None else self.text
 		self.font = font
 		self.base_color, self.hovering_color = base_color, hovering_color
 		self.text_input = text_input
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		self.hovering = False
+		self.text = render_text(self.font, self.text_input, True, self.base_color)
+		self.image = image if image is not None else self.text
 		self.rect = self.image.get_rect(center=pos)
 		self.text_rect = self.text.get_rect(center=pos)
 
@@ -19,7 +21,9 @@ class Button:
 		return self.rect.collidepoint(position)
 
 	def changeColor(self, position):
-		if self.rect.collidepoint(position):
-			self.text = self.font.render(self.text_input, True, self.hovering_color)
+		hovering = self.rect.collidepoint(position)
+		if hovering == self.hovering:
 			return
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		self.hovering = hovering
+		color = self.hovering_color if hovering else self.base_color
+		self.text = render_text(self.font, self.text_input, True, color)
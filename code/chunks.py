@@ -0,0 +1,32 @@
+import pygame
+from settings import *
+
+class StaticChunks:
+    def __init__(self, chunk_size = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = {}
+
+    def bake(self, pieces):
+        # pieces are (pos, surf) pairs, drawn in the same centery order the sprites would use
+        size = self.chunk_size
+        for pos, surf in sorted(pieces, key = lambda piece: piece[1].get_rect(topleft = piece[0]).centery):
+            rect = surf.get_rect(topleft = pos)
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+                    chunk = self.chunks.get((cx, cy))
+                    if chunk is None:
+                        chunk = pygame.Surface((size, size), pygame.SRCALPHA).convert_alpha()
+                        self.chunks[(cx, cy)] = chunk
+                    chunk.blit(surf, (rect.x - cx * size, rect.y - cy * size))
+
+    def draw(self, surface, view):
+        size = self.chunk_size
+        batch = []
+        for cy in range(view.top // size, (view.bottom - 1) // size + 1):
+            for cx in range(view.left // size, (view.right - 1) // size + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                batch.append((chunk, (cx * size - view.x, cy * size - view.y)))
+        if batch:
+            surface.blits(batch, False)
@@ -0,0 +1,81 @@
+import pygame
+from settings import *
+
+class CollisionGroup(pygame.sprite.Group):
+    def __init__(self, cell_size = TILE_SIZE):
+        super().__init__()
+        self.cell_size = cell_size
+
+        # static blockers are plain hitboxes, dynamic ones are sprites re-bucketed on refresh
+        self.static_cells = {}
+        self.dynamic_cells = {}
+        self.sprite_cells = {}
+        self.pending = {}
+
+    def cells(self, rect):
+        size = self.cell_size
+        return [(col, row)
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1)
+                for col in range(rect.left // size, (rect.right - 1) // size + 1)]
+
+    def add_static(self, hitbox):
+        for cell in self.cells(hitbox):
+            self.static_cells.setdefault(cell, []).append(hitbox)
+
+    def remove_static(self, hitbox):
+        for cell in self.cells(hitbox):
+            bucket = self.static_cells[cell]
+            bucket.remove(hitbox)
+            if not bucket:
+                del self.static_cells[cell]
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        # hitboxes are set after the sprite joins its groups, so index it on the next query
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.pending.pop(sprite, None)
+        self.unindex(sprite)
+
+    def index(self, sprite):
+        hitbox = getattr(sprite, 'hitbox', None)
+        if hitbox is None:
+            # not blocking yet, e.g. a freshly planted seed
+            self.sprite_cells[sprite] = ()
+            return
+        cells = self.cells(hitbox)
+        for cell in cells:
+            self.dynamic_cells.setdefault(cell, {})[sprite] = None
+        self.sprite_cells[sprite] = cells
+
+    def unindex(self, sprite):
+        for cell in self.sprite_cells.pop(sprite, ()):
+            bucket = self.dynamic_cells[cell]
+            del bucket[sprite]
+            if not bucket:
+                del self.dynamic_cells[cell]
+
+    def refresh(self, sprite):
+        if sprite not in self.sprite_cells:
+            return
+        self.unindex(sprite)
+        self.index(sprite)
+
+    def flush_pending(self):
+        for sprite in self.pending:
+            self.index(sprite)
+        self.pending.clear()
+
+    def blockers(self, rect):
+        if self.pending:
+            self.flush_pending()
+
+        hitboxes = []
+        sprites = {}
+        for cell in self.cells(rect):
+            hitboxes.extend(self.static_cells.get(cell, ()))
+            sprites.update(self.dynamic_cells.get(cell, ()))
+        hitboxes.extend(sprite.hitbox for sprite in sprites)
+        return hitboxes
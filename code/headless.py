@@ -0,0 +1,95 @@
+import os, json, random, time
+import pygame
+from settings import *
+from support import assets
+
+# (ticks, keys held) steps, repeated for the whole run: walk to the field, then till,
+# plant and water a column of tiles and walk back
+FARM_ROW = [
+    (20, ['K_SPACE']),
+    (25, []),
+    (5, ['K_LCTRL']),
+    (1, ['K_q']), (15, []),
+    (1, ['K_q']), (15, []),
+    (10, ['K_SPACE']),
+    (25, []),
+    (1, ['K_q']), (15, []),
+    (20, ['K_DOWN'])
+]
+DEFAULT_SCRIPT = [(120, ['K_LEFT'])] + FARM_ROW * 4 + [(80, ['K_UP']), (120, ['K_RIGHT'])]
+
+class KeyState:
+    def __init__(self, keys):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+class ScriptedInput:
+    def __init__(self, script = DEFAULT_SCRIPT):
+        self.steps = [(ticks, KeyState(getattr(pygame, name) for name in keys))
+                      for ticks, keys in script]
+        self.index = 0
+        self.ticks = 0
+        self.keys = KeyState(())
+
+    def step(self):
+        # moves on one tick and returns the key events a keyboard would have sent
+        ticks, keys = self.steps[self.index]
+        self.ticks += 1
+        if self.ticks >= ticks:
+            self.ticks = 0
+            self.index = (self.index + 1) % len(self.steps)
+
+        events = [pygame.event.Event(pygame.KEYUP, key = key) for key in self.keys.keys - keys.keys]
+        events += [pygame.event.Event(pygame.KEYDOWN, key = key) for key in keys.keys - self.keys.keys]
+        self.keys = keys
+        return events
+
+    def __call__(self):
+        return self.keys
+
+def load_script(path):
+    with open(path) as file:
+        return [(ticks, keys) for ticks, keys in json.load(file)]
+
+def run_headless(days, ticks_per_day = HEADLESS_TICKS_PER_DAY, dt = HEADLESS_DT, script = None,
+                 seed = None, map_path = MAP_PATH, load_path = None):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    random.seed(seed)
+
+    pygame.display.init()
+    pygame.font.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    assets.audio = False
+
+    from level import Level
+    from save import read_save, restore
+    level = Level(headless = True, save_path = None, map_path = map_path)
+    # a save is only read, simulated days never overwrite it
+    if load_path:
+        state = read_save(load_path)
+        if state is None:
+            raise SystemExit(f'could not read save {load_path}')
+        restore(level, state)
+    scripted_input = ScriptedInput(script or DEFAULT_SCRIPT)
+    level.player.get_keys = scripted_input
+
+    start = time.perf_counter()
+    for day in range(days):
+        for tick in range(ticks_per_day):
+            for event in scripted_input.step():
+                level.handle_event(event)
+            level.run(dt)
+        level.reset()
+    elapsed = time.perf_counter() - start
+
+    player = level.player
+    ticks = days * ticks_per_day
+    print(f'{days} days, {ticks} ticks in {elapsed:.2f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s)')
+    print(f'money: {player.money}')
+    print(f'items: {player.item_inventory}')
+    print(f'seeds: {player.seed_inventory}')
+    print(f'tilled: {level.soil_layer.grid.count(TILLED)}, planted: {level.soil_layer.grid.count(PLANTED)}')
+    return level
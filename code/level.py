@@ -1,29 +1,40 @@
-import pygame
+import pygame, os
+from itertools import count
+from math import ceil
 from settings import *
 from player import Player
 from overlay import Overlay
 from sprites import Generic, Water, WildFlower, Tree, Interaction, Particle
-from pytmx.util_pygame import load_pygame
 from support import *
 from transition import Transition
 from soil import SoilLayer
-from sky import Rain, Sky
+from sky import Rain, Sky, Tint
 from random import randint
 from menu import Menu
+from chunks import StaticChunks
+from collision import CollisionGroup
+from tilemap import load_map
+from world import World, GroundTiles
+from profiler import profiler
+from timer import scheduler
+from animation import clocks
+from audio import audio
+from save import Autosave
 
 class Level:
-    def __init__(self):
+    def __init__(self, headless = False, save_path = SAVE_PATH, map_path = MAP_PATH):
         # get the display surface
         self.display_surface = pygame.display.get_surface()
-        self.bg = pygame.mixer.Sound('../audio/bg.mp3')
+        self.headless = headless
+        self.map_path = map_path
 
         # sprite groups
         self.all_sprites = CameraGroup()
-        self.collision_sprites = pygame.sprite.Group()
+        self.collision_sprites = CollisionGroup()
         self.tree_sprites = pygame.sprite.Group()
         self.interaction_sprites = pygame.sprite.Group()
         self.shop_active = False
-        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites)
+        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites, map_path)
         self.setup()
 
         self.menu = Menu(self.player, self.toggle_shop)
@@ -32,67 +43,115 @@ class Level:
         self.transition = Transition(self.reset, self.player)
 
         #sky
-        self.rain = Rain(self.all_sprites)
+        self.rain = Rain(self.all_sprites, self.map_size)
         self.raining = False
         self.soil_layer.raining = self.raining
         self.sky = Sky()
-
-        self.success = pygame.mixer.Sound('../audio/success.wav')
+        self.tint = Tint()
+
+        # saves are written at every day rollover, no save path runs without persistence
+        self.saves = Autosave(save_path) if save_path else None
+        if self.saves:
+            self.saves.load(self)
+
+        # live counts for the profiler overlay
+        profiler.add_counter('sprites', lambda: len(self.all_sprites))
+        profiler.add_counter('colliders', lambda: len(self.collision_sprites))
+        profiler.add_counter('rain drops', lambda: len(self.rain.floor) + len(self.rain.drops))
+        profiler.add_counter('plants', lambda: len(self.soil_layer.plant_sptires))
+        profiler.add_counter('asset cache', lambda: f'{assets.stats()["hit rate"]:.0%} hits, '
+                                                    f'{assets.bytes / 2**20:.1f} MB')
+        profiler.add_counter('text cache', lambda: f'{text_cache.stats()["hit rate"]:.0%} hits, '
+                                                   f'{len(text_cache.entries)} entries')
 
     def setup(self):
-        self.bg.play()
-        tmx_data = load_pygame('../data/map.tmx')
+        audio.play_music(MUSIC_PATH)
+        tmx_data = load_map(self.map_path)
+        self.map_size = (tmx_data.width * TILE_SIZE, tmx_data.height * TILE_SIZE)
+
+        if WORLD_STREAMING:
+            # chunks around the player are built once the player exists
+            self.world = World(self, tmx_data)
+        else:
+            self.world = None
+            self.build_map(tmx_data)
 
+        # Player
+        for obj in tmx_data.objects('Player'):
+            if obj.name=='Start':
+                self.player = Player((obj.x, obj.y), self.all_sprites, self.collision_sprites,
+                                     self.tree_sprites, self.interaction_sprites, self.soil_layer,
+                                     self.toggle_shop)
+                if self.world:
+                    self.world.update(self.player.rect.center)
+            if obj.name=='Bed':
+                Interaction((obj.x, obj.y), (obj.height, obj.width), self.interaction_sprites,
+                            obj.name)
+
+            if obj.name == 'Trader':
+                Interaction((obj.x, obj.y), (obj.height, obj.width), self.interaction_sprites,
+                            obj.name)
+
+    def build_map(self, tmx_data):
         # house
+        house_bottom = []
         for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
+            for x, y, surf in tmx_data.tiles(layer):
+                if STATIC_CHUNKS:
+                    house_bottom.append(((x*TILE_SIZE, y*TILE_SIZE), surf))
+                    continue
                 Generic(pos = (x*TILE_SIZE, y*TILE_SIZE), surf = surf, groups = self.all_sprites,
                         z = LAYERS['house bottom'])
+        if STATIC_CHUNKS:
+            self.all_sprites.add_static(LAYERS['house bottom'], house_bottom)
 
         for layer in ['HouseWalls', 'HouseFurnitureTop']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
+            for x, y, surf in tmx_data.tiles(layer):
                 Generic(pos = (x*TILE_SIZE, y*TILE_SIZE), surf = surf, groups = self.all_sprites)
 
         # fence
-        for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
+        for x, y, surf in tmx_data.tiles('Fence'):
             Generic((x*TILE_SIZE, y*TILE_SIZE), surf, [self.all_sprites, self.collision_sprites])
 
         # water
         water_frames = import_folder('../graphics/water')
-        for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
+        for x, y, surf in tmx_data.tiles('Water'):
             Water(pos = (x*TILE_SIZE, y*TILE_SIZE), frames = water_frames, groups = self.all_sprites)
 
         # trees
-        for obj in tmx_data.get_layer_by_name('Trees'):
+        for obj in tmx_data.objects('Trees'):
             Tree((obj.x, obj.y), obj.image,
                  [self.all_sprites, self.collision_sprites, self.tree_sprites], obj.name,
                  self.player_add)
 
         # wildFlowers
-        for obj in tmx_data.get_layer_by_name('Decoration'):
+        for obj in tmx_data.objects('Decoration'):
             WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
 
-        Generic((0, 0), pygame.image.load('../graphics/world/ground.png').convert_alpha()
-                , self.all_sprites, LAYERS['ground'])
+        if os.path.exists(tmx_data.ground):
+            # held by its sprite for the whole game, pinned in the cache so it's never decoded twice
+            ground = assets.container(('ground', tmx_data.ground), lambda: import_image(tmx_data.ground))
+            ground_pieces = [((0, 0), ground)]
+        else:
+            # generated maps too large for one ground image only come with the streaming pieces
+            ground = GroundTiles(tmx_data.ground, STREAM_CHUNK_TILES * TILE_SIZE)
+            span = ground.size
+            keys = [(x, y) for y in range(ceil(self.map_size[1] / span))
+                    for x in range(ceil(self.map_size[0] / span))]
+            # every piece decodes on the loader pool at once, missing ones leave the ground empty there
+            ground.prefetch(keys)
+            ground_pieces = [((x * span, y * span), ground.piece(x, y)) for x, y in keys]
+            ground_pieces = [(pos, surf) for pos, surf in ground_pieces if surf is not None]
+        if STATIC_CHUNKS:
+            self.all_sprites.add_static(LAYERS['ground'], ground_pieces)
+        else:
+            for pos, ground_surf in ground_pieces:
+                Generic(pos, ground_surf, self.all_sprites, LAYERS['ground'])
 
         # collision tiles
-        for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
-            Generic((x * TILE_SIZE, y * TILE_SIZE), pygame.Surface((TILE_SIZE, TILE_SIZE)),
-                    self.collision_sprites)
-
-        # Player
-        for obj in tmx_data.get_layer_by_name('Player'):
-            if obj.name=='Start':
-                self.player = Player((obj.x, obj.y), self.all_sprites, self.collision_sprites,
-                                     self.tree_sprites, self.interaction_sprites, self.soil_layer,
-                                     self.toggle_shop)
-            if obj.name=='Bed':
-                Interaction((obj.x, obj.y), (obj.height, obj.width), self.interaction_sprites,
-                            obj.name)
-
-            if obj.name == 'Trader':
-                Interaction((obj.x, obj.y), (obj.height, obj.width), self.interaction_sprites,
-                            obj.name)
+        for x, y, surf in tmx_data.tiles('Collision'):
+            rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            self.collision_sprites.add_static(rect.inflate(-rect.width*0.2, -rect.height*0.75))
 
     def reset(self):
         self.soil_layer.update_plants()
@@ -108,60 +167,220 @@ class Level:
                 for apple in tree.apple_sprites.sprites():
                     apple.kill()
             tree.create_fruit()
+        if self.world:
+            self.world.regrow_fruit()
+
+        if self.saves:
+            self.saves.save(self)
+
+    def tree_states(self):
+        if self.world:
+            return self.world.tree_states()
+        return [(tree.health, tree.alive, tree.apple_slots()) for tree in self.tree_sprites]
+
+    def restore_trees(self, states):
+        if self.world:
+            self.world.restore_trees(states)
+            return
+        trees = self.tree_sprites.sprites()
+        if len(trees) == len(states):
+            for tree, (health, alive, apple_slots) in zip(trees, states):
+                tree.restore(health, bool(alive), apple_slots)
 
     def run(self, dt):
+        scheduler.advance(dt)
+        if self.saves:
+            self.saves.check()
+        if self.world:
+            self.world.update(self.player.rect.center)
 
-        self.display_surface.fill('black')
-        self.all_sprites.custom_draw(self.player)
+        if not self.headless:
+            with profiler.section('draw'):
+                self.display_surface.fill('black')
+                self.all_sprites.custom_draw(self.player)
 
         if self.shop_active:
-            self.menu.update()
+            with profiler.section('menu'):
+                if self.headless:
+                    self.menu.input()
+                else:
+                    self.menu.update()
         else:
-            self.all_sprites.update(dt)
-            self.plant_collision()
-
-        self.overlay.display()
-
-        if self.raining and not self.shop_active:
-            self.rain.update()
-
-        self.sky.display(dt)
-
-        if self.player.sleep:
-            self.transition.play()
+            with profiler.section('update'):
+                clocks.advance(dt)
+                self.all_sprites.update(dt)
+            with profiler.section('plant collision'):
+                self.plant_collision()
+
+        if not self.headless:
+            with profiler.section('overlay'):
+                self.overlay.display()
+
+            if not self.shop_active:
+                with profiler.section('rain'):
+                    self.rain.update(dt, self.raining)
+
+        with profiler.section('sky'):
+            self.sky.update(dt)
+            if self.player.sleep:
+                self.transition.update()
+            if not self.headless:
+                self.tint.display(self.sky.start_color, self.transition.color)
+
+        profiler.end_frame(dt)
+        if not self.headless:
+            profiler.draw(self.display_surface)
+
+    def handle_event(self, event):
+        profiler.handle_event(event)
+        if not self.shop_active:
+            self.player.handle_event(event)
 
     def player_add(self, item):
-        self.success.play()
+        audio.play('success')
         self.player.item_inventory[item] += 1
 
     def toggle_shop(self):
         self.shop_active = not self.shop_active
 
     def plant_collision(self):
-        if self.soil_layer.plant_sptires:
-            for plant in self.soil_layer.plant_sptires.sprites():
-                if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
-                    self.player_add(plant.plant_type)
-                    plant.kill()
-                    Particle(plant.rect.topleft, plant.image, self.all_sprites, LAYERS['main'])
-                    row = plant.rect.centery // TILE_SIZE
-                    col = plant.rect.centerx // TILE_SIZE
-                    self.soil_layer.grid[row][col].remove('P')
+        for plant in self.soil_layer.harvestable_plants(self.player.hitbox):
+            self.player_add(plant.plant_type)
+            self.soil_layer.remove_plant(plant)
+            Particle.spawn(plant.rect.topleft, plant.image, self.all_sprites, LAYERS['main'])
 
 class CameraGroup(pygame.sprite.Group):
-    def __init__(self):
+    def __init__(self, cell_size = CAMERA_CELL_SIZE):
         super().__init__()
         self.display_surface = pygame.display.get_surface()
         self.offset = pygame.math.Vector2()
+        self.view = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.cell_size = cell_size
+
+        # per z, sprites that stay put live in the cell under their midbottom, which growing
+        # plants and trees turning into stumps keep, sprites that move are checked every frame
+        self.layers = {z: {} for z in sorted(LAYERS.values())}
+        self.moving = {z: {} for z in self.layers}
+        # largest sprite added to each z, how far past the view its cells are searched
+        self.margins = {z: 0 for z in self.layers}
+        # sprite -> (z, cell or None for moving sprites, draw order for equal centery)
+        self.sprite_layers = {}
+        self.order = count()
+        self.pending = {}
+        self.updating = {}
+
+        # chunk surfaces and particle emitters drawn underneath the sprites of their layer
+        self.static_layers = {}
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        # sprites join their groups before setting rect and z, so bucket them on the next draw
+        self.pending[sprite] = None
+        # tiles, water and other sprites without their own update are skipped in update
+        if type(sprite).update is not pygame.sprite.Sprite.update:
+            self.updating[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.updating.pop(sprite, None)
+        if sprite in self.pending:
+            del self.pending[sprite]
+            return
+        if sprite in self.sprite_layers:
+            self.unplace(sprite)
+
+    def update(self, *args, **kwargs):
+        for sprite in list(self.updating):
+            sprite.update(*args, **kwargs)
+
+    def place(self, sprite):
+        z, rect = sprite.z, sprite.rect
+        self.get_bucket(z)
+        if getattr(sprite, 'moves', False):
+            cell = None
+            self.moving[z][sprite] = None
+        else:
+            cell = (rect.centerx // self.cell_size, rect.bottom // self.cell_size)
+            self.layers[z].setdefault(cell, {})[sprite] = None
+            self.margins[z] = max(self.margins[z], rect.width, rect.height)
+        self.sprite_layers[sprite] = (z, cell, next(self.order))
+
+    def unplace(self, sprite):
+        z, cell, _ = self.sprite_layers.pop(sprite)
+        if cell is None:
+            del self.moving[z][sprite]
+            return
+        bucket = self.layers[z][cell]
+        del bucket[sprite]
+        if not bucket:
+            del self.layers[z][cell]
+
+    def add_static(self, z, pieces):
+        chunks = StaticChunks()
+        chunks.bake(pieces)
+        self.attach(z, chunks)
+
+    def attach(self, z, drawable):
+        # anything with draw(surface, view), drawn before the sprites of layer z
+        self.static_layers.setdefault(z, []).append(drawable)
+        self.get_bucket(z)
+
+    def get_bucket(self, z):
+        if z not in self.layers:
+            self.layers = dict(sorted({**self.layers, z: {}}.items()))
+            self.moving[z] = {}
+            self.margins[z] = 0
+        return self.layers[z]
+
+    def change_layer(self, sprite):
+        self.unplace(sprite)
+        self.place(sprite)
+
+    def flush_pending(self):
+        for sprite in self.pending:
+            self.place(sprite)
+        self.pending.clear()
+
+    def visible(self, z, cells, view):
+        # sprites of z overlapping the view, in draw order
+        size, margin = self.cell_size, self.margins[z]
+        found = []
+        if cells:
+            left, right = (view.left - margin) // size, (view.right + margin) // size
+            top, bottom = view.top // size, (view.bottom + margin) // size
+            for row in range(top, bottom + 1):
+                for col in range(left, right + 1):
+                    bucket = cells.get((col, row))
+                    if bucket:
+                        found.extend(sprite for sprite in bucket if view.colliderect(sprite.rect))
+        found.extend(sprite for sprite in self.moving[z] if view.colliderect(sprite.rect))
+        sprite_layers = self.sprite_layers
+        found.sort(key = lambda sprite: (sprite.rect.centery, sprite_layers[sprite][2]))
+        return found
 
     def custom_draw(self, player):
-        self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
-        self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
-
-        for layer in LAYERS.values():
-            for sprite in sorted(self.sprites(), key = lambda sprite: sprite.rect.centery):
-                if layer != sprite.z:
+        self.offset.x = player.rect.centerx - SCREEN_WIDTH // 2
+        self.offset.y = player.rect.centery - SCREEN_HEIGHT // 2
+        offset_x, offset_y = int(self.offset.x), int(self.offset.y)
+        self.view.topleft = (offset_x, offset_y)
+        view = self.view
+        self.flush_pending()
+
+        moved = []
+        for z, cells in self.layers.items():
+            for drawable in self.static_layers.get(z, ()):
+                drawable.draw(self.display_surface, view)
+
+            batch = []
+            for sprite in self.visible(z, cells, view):
+                if sprite.z != z:
+                    moved.append(sprite)
                     continue
-                offset_rect = sprite.rect.copy()
-                offset_rect.center -= self.offset
-                self.display_surface.blit(sprite.image, offset_rect)
+                rect = sprite.rect
+                batch.append((sprite.image, (rect.x - offset_x, rect.y - offset_y)))
+            if batch:
+                self.display_surface.blits(batch, False)
+
+        # sprites that changed their z since they were added, found when they come into view
+        for sprite in moved:
+            self.change_layer(sprite)
@@ -0,0 +1,71 @@
+import pygame
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from os import walk
+from os.path import exists, join, normpath
+from settings import *
+from support import assets, atlas_paths, frame_files, read_atlas_index
+from tilemap import map_ground
+
+# loaded whole by Level and its sprites, besides the packed frame folders
+STARTUP_FOLDERS = ['../graphics/overlay', '../graphics/stumps']
+STARTUP_IMAGES = ['../graphics/fruit/apple.png']
+
+# shared by startup loading and world streaming, files are decoded off the main thread
+pool = ThreadPoolExecutor(LOADER_WORKERS, thread_name_prefix = 'assets')
+
+def folder_images(folder):
+    # the atlas when it's current, the same check the frame loaders make
+    if folder in map(normpath, ATLAS_FOLDERS) and read_atlas_index(folder) is not None:
+        return [atlas_paths(folder)[0]]
+    return [join(path, img) for path, _, __ in sorted(walk(folder)) for img in frame_files(path)]
+
+def startup_assets(map_path = MAP_PATH):
+    images = []
+    for folder in ATLAS_FOLDERS + STARTUP_FOLDERS:
+        images.extend(folder_images(normpath(folder)))
+    images.extend(STARTUP_IMAGES)
+
+    atlas_path = normpath(map_path) + '.atlas.png'
+    if exists(atlas_path):
+        images.append(atlas_path)
+    # streamed worlds only read the ground pieces around the player
+    ground = map_ground(map_path)
+    if not WORLD_STREAMING and exists(ground):
+        images.append(ground)
+
+    sounds = []
+    if assets.audio and pygame.mixer.get_init():
+        sounds = [path for path, _, __ in SOUNDS.values()]
+    return images, sounds
+
+class AssetLoader:
+    def __init__(self, images, sounds = (), batch = LOADER_BATCH, interval = LOADER_INTERVAL):
+        self.images = images
+        self.sounds = sounds
+        self.batch = batch
+        self.interval = interval
+
+    def run(self, progress = None):
+        # files are decoded on the pool, pygame lets go of the GIL while it reads them
+        total = len(self.images) + len(self.sounds)
+        done = 0
+        jobs = {pool.submit(pygame.image.load, path): (assets.add_surface, path) for path in self.images}
+        jobs.update({pool.submit(pygame.mixer.Sound, path): (assets.add_sound, path)
+                     for path in self.sounds})
+        ready, pending = [], set(jobs)
+        while ready or pending:
+            if pending:
+                # a slow file still gets the screen redrawn every interval
+                finished, pending = wait(pending, 0 if ready else self.interval, FIRST_COMPLETED)
+                ready.extend(finished)
+            for job in ready[:self.batch]:
+                add, path = jobs[job]
+                try:
+                    add(path, job.result())
+                except (OSError, pygame.error):
+                    # left to the cache, it raises at the same place it did before preloading
+                    pass
+                done += 1
+            del ready[:self.batch]
+            if progress:
+                progress(done / total)
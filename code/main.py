@@ -1,27 +1,69 @@
-import pygame, sys
+import pygame, sys, argparse
 from settings import *
 from level import Level
+from loader import AssetLoader, startup_assets
 
 class Game:
-    def __init__(self):
+    def __init__(self, map_path = MAP_PATH, save_path = SAVE_PATH):
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Farm Game')
         self.clock = pygame.time.Clock()
-        self.level = Level()
+
+        # files decode in the background while the loading screen fills, Level then reads them cached
+        self.font = pygame.font.Font('../font/LycheeSoda.ttf', 30)
+        self.show_progress(0)
+        AssetLoader(*startup_assets(map_path)).run(self.show_progress)
+        # building the level itself still takes a moment after the files are in
+        self.show_progress(1, 'Building the farm')
+        self.level = Level(save_path = save_path, map_path = map_path)
+
+    def show_progress(self, progress, text = 'Loading'):
+        # keeps the window responding, quitting waits until the level exists
+        pygame.event.pump()
+        self.screen.fill('Black')
+        bar = pygame.Rect(0, 0, SCREEN_WIDTH // 2, 24)
+        bar.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        pygame.draw.rect(self.screen, 'White', bar.inflate(8, 8), 2, 4)
+        pygame.draw.rect(self.screen, 'White', (*bar.topleft, bar.width * progress, bar.height), 0, 4)
+        text_surf = self.font.render(text, False, 'White')
+        self.screen.blit(text_surf, text_surf.get_rect(midbottom = (bar.centerx, bar.top - 16)))
+        pygame.display.update()
 
     def run(self):
         while True:
             for event in pygame.event.get():
-                if event.type != pygame.QUIT:
-                    continue
-                pygame.quit()
-                sys.exit()
+                if event.type == pygame.QUIT:
+                    if self.level.saves:
+                        self.level.saves.flush()
+                    pygame.quit()
+                    sys.exit()
+                self.level.handle_event(event)
 
             dt = self.clock.tick() / 1000
             self.level.run(dt)
             pygame.display.update()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description = 'Farm Game')
+    parser.add_argument('--headless', action = 'store_true',
+                        help = 'run the simulation without a window or audio')
+    parser.add_argument('--days', type = int, default = 1, help = 'days to simulate when headless')
+    parser.add_argument('--ticks-per-day', type = int, default = HEADLESS_TICKS_PER_DAY)
+    parser.add_argument('--script', help = 'JSON list of [ticks, [key names]] steps driving the player')
+    parser.add_argument('--seed', type = int, help = 'random seed for reproducible runs')
+    parser.add_argument('--map', default = MAP_PATH, help = 'TMX map to play')
+    parser.add_argument('--save', help = 'save file to continue and autosave to, '
+                                         'headless runs only load it')
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    game = Game()
-    game.run()
+    args = parse_args()
+    if args.headless:
+        from headless import run_headless, load_script
+        run_headless(args.days, args.ticks_per_day,
+                     script = load_script(args.script) if args.script else None, seed = args.seed,
+                     map_path = args.map, load_path = args.save)
+    else:
+        game = Game(args.map, args.save or SAVE_PATH)
+        game.run()
@@ -1,6 +1,7 @@
 import pygame
 from settings import *
 from timer import Timer
+from support import render_text
 
 class Menu:
     def __init__(self, player, toggle_menu):
@@ -20,12 +21,21 @@ class Menu:
         self.index = 0
         self.timer = Timer(200)
 
-    def display_money(self):
-        text_surf = self.font.render(f'${self.player.money}', False, 'Black')
+        # retained surfaces, redrawn only when the shop contents change
+        self.dirty = True
+        self.player.subscribe(self.invalidate)
+
+    def invalidate(self):
+        self.dirty = True
+
+    def render_money(self):
+        text_surf = render_text(self.font, f'${self.player.money}', False, 'Black')
         text_rect = text_surf.get_rect(midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 20))
+        self.money_rect = text_rect.inflate(10,10)
 
-        pygame.draw.rect(self.display_surface, 'White', text_rect.inflate(10,10), 0, 4)
-        self.display_surface.blit(text_surf, text_rect)
+        self.money_surf = pygame.Surface(self.money_rect.size, pygame.SRCALPHA)
+        pygame.draw.rect(self.money_surf, 'White', self.money_surf.get_rect(), 0, 4)
+        self.money_surf.blit(text_surf, text_surf.get_rect(center = self.money_surf.get_rect().center))
 
     def setup(self):
         self.text_surfs = []
@@ -43,18 +53,19 @@ class Menu:
         self.sell_text = self.font.render('sell',False, 'Black')
 
     def input(self):
-        keys = pygame.key.get_pressed()
-        self.timer.update()
+        keys = self.player.get_keys()
         if keys[pygame.K_ESCAPE]:
             self.toggle_menu()
         if not self.timer.active:
             if keys[pygame.K_UP]:
                 if self.index != 0:
                     self.index -= 1
+                    self.dirty = True
                     self.timer.activate()
             if keys[pygame.K_DOWN]:
                 if self.index != len(self.options) - 1:
                     self.index += 1
+                    self.dirty = True
                     self.timer.activate()
             if keys[pygame.K_SPACE]:
                 self.timer.activate()
@@ -69,31 +80,38 @@ class Menu:
                         self.player.money -= PURCHASE_PRICES[current_item]
 
     def show_entry(self, text_surf, amount, top, selected):
-        bg_rect = pygame.Rect(self.main_rect.left, top, self.width, text_surf.get_height() + self.padding * 2)
-        pygame.draw.rect(self.display_surface, 'White', bg_rect, 0, 4)
+        # draws onto the panel, so everything is relative to main_rect
+        bg_rect = pygame.Rect(0, top, self.width, text_surf.get_height() + self.padding * 2)
+        pygame.draw.rect(self.panel, 'White', bg_rect, 0, 4)
 
-        text_rect = text_surf.get_rect(midleft = (self.main_rect.left + 20, bg_rect.centery))
-        self.display_surface.blit(text_surf, text_rect)
+        text_rect = text_surf.get_rect(midleft = (20, bg_rect.centery))
+        self.panel.blit(text_surf, text_rect)
 
-        amount_surf = self.font.render(str(amount),False, 'Black')
-        amount_rect = amount_surf.get_rect(midright = (self.main_rect.right - 20,bg_rect.centery))
-        self.display_surface.blit(amount_surf, amount_rect)
+        amount_surf = render_text(self.font, str(amount), False, 'Black')
+        amount_rect = amount_surf.get_rect(midright = (self.width - 20,bg_rect.centery))
+        self.panel.blit(amount_surf, amount_rect)
 
         if selected:
-            pygame.draw.rect(self.display_surface, 'Black', bg_rect,4,4)
+            pygame.draw.rect(self.panel, 'Black', bg_rect,4,4)
             if self.index <= self.sell_border:
-                pos_rect = self.sell_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.sell_text, pos_rect)
+                pos_rect = self.sell_text.get_rect(midleft = (150, bg_rect.centery))
+                self.panel.blit(self.sell_text, pos_rect)
             else:
-                pos_rect = self.buy_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                self.display_surface.blit(self.buy_text, pos_rect)
+                pos_rect = self.buy_text.get_rect(midleft = (150, bg_rect.centery))
+                self.panel.blit(self.buy_text, pos_rect)
 
-
-    def update(self):
-        self.input()
-        self.display_money()
+    def render(self):
+        self.render_money()
+        self.panel = pygame.Surface(self.main_rect.size, pygame.SRCALPHA)
+        amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
         for text_index, text_surf in enumerate(self.text_surfs):
-            top = self.main_rect.top + text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
-            amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
+            top = text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
             self.show_entry(text_surf, amount_list[text_index], top, self.index == text_index)
+        self.dirty = False
 
+    def update(self):
+        self.input()
+        if self.dirty:
+            self.render()
+        self.display_surface.blit(self.money_surf, self.money_rect)
+        self.display_surface.blit(self.panel, self.main_rect)
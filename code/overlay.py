@@ -1,5 +1,6 @@
 import pygame
 from settings import *
+from support import import_image
 
 class Overlay:
     def __init__(self, player):
@@ -10,16 +11,31 @@ class Overlay:
 
         # imports
         overlay_path = '../graphics/overlay/'
-        self.tools_surf = {tool:pygame.image.load(f'{overlay_path}{tool}.png').convert_alpha() for tool in player.tools}
-        self.seeds_surf = {seed:pygame.image.load(f'{overlay_path}{seed}.png').convert_alpha() for seed in player.seeds}
+        self.tools_surf = {tool:import_image(f'{overlay_path}{tool}.png') for tool in player.tools}
+        self.seeds_surf = {seed:import_image(f'{overlay_path}{seed}.png') for seed in player.seeds}
 
-    def display(self):
+        # retained panel, rebuilt when the player's selection changes
+        self.panel = None
+        self.panel_rect = None
+        self.player.subscribe(self.invalidate)
 
-        # tool
+    def invalidate(self):
+        self.panel = None
+
+    def render(self):
         tool_surf = self.tools_surf[self.player.selected_tool]
         tool_rect = tool_surf.get_rect(midbottom = OVERLAY_POSITIONS['tool'])
-        self.display_surface.blit(tool_surf,tool_rect)
-        # seeds
         seed_surf = self.seeds_surf[self.player.selected_seed]
         seed_rect = seed_surf.get_rect(midbottom = OVERLAY_POSITIONS['seed'])
-        self.display_surface.blit(seed_surf,seed_rect)
+
+        self.panel_rect = tool_rect.union(seed_rect)
+        self.panel = pygame.Surface(self.panel_rect.size, pygame.SRCALPHA)
+        # tool
+        self.panel.blit(tool_surf, tool_rect.move(-self.panel_rect.x, -self.panel_rect.y))
+        # seeds
+        self.panel.blit(seed_surf, seed_rect.move(-self.panel_rect.x, -self.panel_rect.y))
+
+    def display(self):
+        if self.panel is None:
+            self.render()
+        self.display_surface.blit(self.panel, self.panel_rect)
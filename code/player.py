@@ -2,12 +2,50 @@ import pygame
 from settings import *
 from support import *
 from timer import Timer
+from audio import audio
+
+class Inventory(dict):
+    def __init__(self, items, on_change):
+        super().__init__(items)
+        self.on_change = on_change
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.on_change()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.on_change()
+
+class Observed:
+    # player attribute that notifies the player's listeners when assigned
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, player, owner = None):
+        if player is None:
+            return self
+        return getattr(player, self.name)
+
+    def __set__(self, player, value):
+        setattr(player, self.name, value)
+        player.notify()
 
 class Player(pygame.sprite.Sprite):
+    # checked by the camera every frame instead of being filed in its grid
+    moves = True
+
+    selected_tool = Observed()
+    selected_seed = Observed()
+    money = Observed()
+
     def __init__(self, pos, group, collision_sprites, tree_sprites, interaction, soil_layer,
                  toggle_shop):
         super().__init__(group)
 
+        # called whenever inventory, money or selection change
+        self.listeners = []
+
         self.import_assets()
         self.status = 'down_idle'
         self.frame_index = 0
@@ -28,14 +66,12 @@ class Player(pygame.sprite.Sprite):
 
         # timers
         self.timers = {
-            'tool switch': Timer(200),
-            'seed switch': Timer(200)
+            'tool use': Timer(0, self.finish_swing)
         }
 
         # actions
         self.actions = {
-            'tool_use' : False,
-            'seed_use' : False
+            'tool_use' : False
         }
 
         # tools
@@ -50,17 +86,17 @@ class Player(pygame.sprite.Sprite):
         self.selected_seed = self.seeds[self.seed_index]
 
         # inventory
-        self.item_inventory = {
+        self.item_inventory = Inventory({
             "wood": 0,
             "apple": 0,
             "corn": 0,
             "tomato": 0
-        }
+        }, self.notify)
 
-        self.seed_inventory = {
+        self.seed_inventory = Inventory({
             'corn': 5,
             'tomato': 5
-        }
+        }, self.notify)
         self.money = 200
 
         # interaction
@@ -70,10 +106,19 @@ class Player(pygame.sprite.Sprite):
         self.sleep = False
         self.soil_layer = soil_layer
         self.toggle_shop = toggle_shop
-        self.wattering = pygame.mixer.Sound('../audio/water.mp3')
 
         self.seed_timer = Timer(400)
 
+        # keyboard state source, replaced by a script in headless runs
+        self.get_keys = pygame.key.get_pressed
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self):
+        for listener in self.listeners:
+            listener()
+
     def use_tool(self):
         if self.selected_tool == 'axe':
             for tree in self.tree_sprites.sprites():
@@ -83,7 +128,53 @@ class Player(pygame.sprite.Sprite):
             self.soil_layer.get_hit(self.target_pos)
         if self.selected_tool == 'water':
             self.soil_layer.water(self.target_pos)
-            self.wattering.play()
+            audio.play('water')
+
+    def start_swing(self):
+        if self.actions['tool_use']:
+            return
+        self.actions['tool_use'] = True
+        self.direction = pygame.math.Vector2()
+        self.get_target_position()
+        self.use_tool()
+        self.seed_timer.activate()
+
+        # a swing lasts one pass of the tool animation and does its work once
+        frames = self.animations[self.status.split('_')[0] + '_' + self.selected_tool]
+        self.frame_index = 0
+        self.timers['tool use'].duration = len(frames) / PLAYER_ANIMATION_SPEED * 1000
+        self.timers['tool use'].activate()
+
+    def finish_swing(self):
+        self.actions['tool_use'] = False
+        # holding the key keeps swinging at the animation's cadence
+        if self.get_keys()[pygame.K_SPACE]:
+            self.start_swing()
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+
+        # tool use
+        if event.key == pygame.K_SPACE:
+            self.start_swing()
+
+        # change tool
+        if event.key == pygame.K_q and not self.actions['tool_use']:
+            self.tool_index = (self.tool_index + 1) % len(self.tools)
+            self.selected_tool = self.tools[self.tool_index]
+
+        # seed use
+        if event.key == pygame.K_LCTRL and not self.seed_timer.active:
+            self.direction = pygame.math.Vector2()
+            self.get_target_position()
+            self.use_seed()
+            self.seed_timer.activate()
+
+        # change seed
+        if event.key == pygame.K_e:
+            self.seed_index = (self.seed_index + 1) % len(self.seeds)
+            self.selected_seed = self.seeds[self.seed_index]
 
     def get_target_position(self):
         self.target_pos = self.rect.center + PLAYER_TOOL_OFFSET[self.status.split('_')[0]]
@@ -105,7 +196,8 @@ class Player(pygame.sprite.Sprite):
             self.animations[animation] = import_folder(full_path)
 
     def animate(self, dt):
-        self.frame_index += 4 * dt
+        # per sprite, not on a shared animation clock, the frame follows the status and the swing
+        self.frame_index += PLAYER_ANIMATION_SPEED * dt
         if self.frame_index > len(self.animations[self.status]):
             self.frame_index = 0
         try:
@@ -115,7 +207,7 @@ class Player(pygame.sprite.Sprite):
             self.image = self.animations[self.status][int(self.frame_index)]
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.get_keys()
 
         if not (True in self.actions.values()) and not self.sleep:
             if keys[pygame.K_UP]:
@@ -136,43 +228,7 @@ class Player(pygame.sprite.Sprite):
             else:
                 self.direction.x = 0
 
-        # tool use
-        if keys[pygame.K_SPACE]:
-            self.actions['tool_use'] = True
-            self.direction = pygame.math.Vector2()
-            self.use_tool()
-            self.seed_timer.activate()
-        else:
-            self.actions['tool_use'] = False
-
-        # change tool
-        if keys[pygame.K_q] and not self.timers['tool switch'].active and not self.actions['tool_use']:
-            self.timers['tool switch'].activate()
-            self.tool_index +=1
-
-            if self.tool_index >= len(self.tools):
-                self.tool_index = 0
-
-            self.selected_tool = self.tools[self.tool_index]
-
-        # seed use
-        if keys[pygame.K_LCTRL] and not self.seed_timer.active:
-            self.actions['seed_use'] = True
-            self.direction = pygame.math.Vector2()
-            self.use_seed()
-            self.seed_timer.activate()
-        else:
-            self.actions['seed_use'] = False
-
-        # change use
-        if keys[pygame.K_e] and not self.timers['seed switch'].active and not self.actions['seed_use']:
-            self.timers['seed switch'].activate()
-            self.seed_index +=1
-
-            if self.seed_index >= len(self.seeds):
-                self.seed_index = 0
-
-            self.selected_seed = self.seeds[self.seed_index]
+        # tools and seeds are used on key presses, see handle_event
 
         if keys[pygame.K_RETURN]:
             collided_interaction_sprite = pygame.sprite.spritecollide(self, self.interaction, False)
@@ -191,31 +247,24 @@ class Player(pygame.sprite.Sprite):
             self.status = self.status.split('_')[0] + '_' + self.selected_tool
 
     def collision(self, direction):
-        for sprite in self.collision_sptires.sprites():
-            if not hasattr(sprite, 'hitbox'):
-                continue
-            if not sprite.hitbox.colliderect(self.hitbox):
+        for hitbox in self.collision_sptires.blockers(self.hitbox):
+            if not hitbox.colliderect(self.hitbox):
                 continue
             if direction == 'horizontal':
                 if self.direction.x > 0:
-                    self.hitbox.right = sprite.hitbox.left
+                    self.hitbox.right = hitbox.left
                 if self.direction.x < 0:
-                    self.hitbox.left = sprite.hitbox.right
+                    self.hitbox.left = hitbox.right
                 self.rect.centerx = self.hitbox.centerx
                 self.pos.x = self.hitbox.centerx
             if direction == 'vertical':
                 if self.direction.y > 0:
-                    self.hitbox.bottom = sprite.hitbox.top
+                    self.hitbox.bottom = hitbox.top
                 if self.direction.y < 0:
-                    self.hitbox.top = sprite.hitbox.bottom
+                    self.hitbox.top = hitbox.bottom
                 self.rect.centery = self.hitbox.centery
                 self.pos.y = self.hitbox.centery
 
-    def update_timers(self):
-        for timer in self.timers.values():
-            timer.update()
-            self.seed_timer.update()
-
     def move(self, dt):
 
         # normalizing a vector
@@ -236,7 +285,6 @@ class Player(pygame.sprite.Sprite):
     def update(self, dt):
         self.input()
         self.get_status()
-        self.update_timers()
         self.get_target_position()
         self.move(dt)
         self.animate(dt)
@@ -0,0 +1,118 @@
+import pygame, cProfile, time
+from os import makedirs
+from os.path import basename, join
+from collections import deque
+from contextlib import contextmanager
+from settings import *
+
+class Profiler:
+    def __init__(self, history = PROFILER_HISTORY):
+        self.history = history
+        self.frame_times = deque(maxlen = history)
+        self.sections = {}
+        self.counters = {}
+        self.current = {}
+        self.visible = False
+
+        # cProfile capture of the next N frames
+        self.capture_profile = None
+        self.capture_left = 0
+        self.last_capture = None
+
+        self.font = None
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] = self.current.get(name, 0) + time.perf_counter() - start
+
+    def timed(self, name, func):
+        # wraps a callable so every call is added to the named section
+        def wrapper(*args, **kwargs):
+            with self.section(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def add_counter(self, name, func):
+        self.counters[name] = func
+
+    def end_frame(self, dt):
+        self.frame_times.append(dt)
+        for name in self.sections.keys() | self.current.keys():
+            if name not in self.sections:
+                self.sections[name] = deque(maxlen = self.history)
+            self.sections[name].append(self.current.get(name, 0))
+        self.current = {}
+
+        if self.capture_profile is not None:
+            self.capture_left -= 1
+            if self.capture_left <= 0:
+                self.stop_capture()
+
+    def start_capture(self, frames = PROFILER_CAPTURE_FRAMES):
+        if self.capture_profile is not None:
+            return
+        self.capture_profile = cProfile.Profile()
+        self.capture_left = frames
+        self.capture_profile.enable()
+
+    def stop_capture(self):
+        self.capture_profile.disable()
+        makedirs(PROFILER_OUTPUT, exist_ok = True)
+        self.last_capture = join(PROFILER_OUTPUT, time.strftime('frames_%Y%m%d_%H%M%S.pstats'))
+        self.capture_profile.dump_stats(self.last_capture)
+        self.capture_profile = None
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == PROFILER_TOGGLE_KEY:
+            self.visible = not self.visible
+        if event.key == PROFILER_CAPTURE_KEY:
+            self.start_capture()
+
+    def average(self, values):
+        return sum(values) / len(values) if values else 0
+
+    def draw(self, surface):
+        if not self.visible:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font('../font/LycheeSoda.ttf', 18)
+
+        lines = [f'frame {self.average(self.frame_times) * 1000:6.2f} ms']
+        for name, values in self.sections.items():
+            lines.append(f'{name} {self.average(values) * 1000:6.2f} ms')
+        for name, func in self.counters.items():
+            lines.append(f'{name} {func()}')
+        if self.capture_profile is not None:
+            lines.append(f'capturing {self.capture_left} frames')
+        elif self.last_capture:
+            lines.append(f'saved {basename(self.last_capture)}')
+
+        graph_height = 60
+        line_height = self.font.get_linesize()
+        height = graph_height + line_height * len(lines) + 15
+        panel = pygame.Rect(PROFILER_POSITION[0], PROFILER_POSITION[1] - height, 280, height)
+        pygame.draw.rect(surface, 'Black', panel, 0, 4)
+
+        # rolling frame time graph, the red line marks 60 fps
+        graph = pygame.Rect(panel.left + 5, panel.top + 5, panel.width - 10, graph_height)
+        scale = graph_height / 0.05
+        if len(self.frame_times) > 1:
+            step = graph.width / (self.history - 1)
+            points = [(graph.left + index * step, graph.bottom - min(value * scale, graph_height))
+                      for index, value in enumerate(self.frame_times)]
+            pygame.draw.lines(surface, 'Green', False, points)
+        target_y = graph.bottom - (1 / 60) * scale
+        pygame.draw.line(surface, 'Red', (graph.left, target_y), (graph.right, target_y))
+
+        top = graph.bottom + 5
+        for line in lines:
+            surface.blit(self.font.render(line, False, 'White'), (panel.left + 8, top))
+            top += line_height
+
+profiler = Profiler()
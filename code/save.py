@@ -0,0 +1,225 @@
+import os, sys, struct, zlib
+from queue import Queue
+from threading import Thread
+from settings import *
+
+SAVE_MAGIC = b'FGSV'
+SAVE_VERSION = 1
+SAVE_HEADER = '<4sH'
+
+class SaveState:
+    def __init__(self, money, items, seeds, sky_color, raining, grid_size, cells, plants, trees):
+        self.money = money
+        self.items = items
+        self.seeds = seeds
+        self.sky_color = sky_color
+        self.raining = raining
+        self.grid_size = grid_size
+        self.cells = cells
+        # (col, row, plant type, age, hitbox) and (health, alive, apple slots)
+        self.plants = plants
+        self.trees = trees
+
+class Writer:
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt, *values):
+        self.parts.append(struct.pack(fmt, *values))
+
+    def string(self, value, length = '<B'):
+        data = value.encode()
+        self.pack(length, len(data))
+        self.parts.append(data)
+
+    def inventory(self, inventory):
+        self.pack('<B', len(inventory))
+        for name, amount in inventory.items():
+            self.string(name)
+            self.pack('<i', amount)
+
+    def getvalue(self):
+        return b''.join(self.parts)
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def bytes(self, length):
+        value = self.data[self.offset:self.offset + length]
+        if len(value) != length:
+            raise ValueError('truncated save')
+        self.offset += length
+        return value
+
+    def string(self, length = '<B'):
+        return self.bytes(self.unpack(length)[0]).decode()
+
+    def inventory(self):
+        return {self.string(): self.unpack('<i')[0] for _ in range(self.unpack('<B')[0])}
+
+def snapshot(level):
+    # runs on the main thread, only packs the state so the frame stays short
+    player, soil_layer = level.player, level.soil_layer
+    grid = soil_layer.grid
+    return encode(SaveState(player.money, player.item_inventory, player.seed_inventory,
+                            level.sky.start_color, level.raining, (grid.width, grid.height),
+                            grid.cells, soil_layer.plant_states(), level.tree_states()))
+
+def encode(state):
+    writer = Writer()
+    writer.pack('<i', state.money)
+    writer.inventory(state.items)
+    writer.inventory(state.seeds)
+    writer.pack('<3dB', *state.sky_color, state.raining)
+
+    writer.pack('<HH', *state.grid_size)
+    writer.parts.append(bytes(state.cells))
+
+    plant_types = sorted(GROW_SPEED)
+    writer.pack('<B', len(plant_types))
+    for plant_type in plant_types:
+        writer.string(plant_type)
+    plants = list(state.plants)
+    writer.pack('<I', len(plants))
+    for col, row, plant_type, age, hitbox in plants:
+        writer.pack('<HHBd4i', col, row, plant_types.index(plant_type), age, *(hitbox or (0, 0, 0, 0)))
+
+    writer.pack('<I', len(state.trees))
+    for health, alive, apple_slots in state.trees:
+        writer.pack('<dBI', health, alive, apple_slots)
+    return writer.getvalue()
+
+def decode(payload):
+    reader = Reader(payload)
+    money = reader.unpack('<i')[0]
+    items = reader.inventory()
+    seeds = reader.inventory()
+    *sky_color, raining = reader.unpack('<3dB')
+
+    width, height = reader.unpack('<HH')
+    cells = reader.bytes(width * height)
+
+    plant_types = [reader.string() for _ in range(reader.unpack('<B')[0])]
+    plants = []
+    for _ in range(reader.unpack('<I')[0]):
+        col, row, type_index, age, *hitbox = reader.unpack('<HHBd4i')
+        plants.append((col, row, plant_types[type_index], age, hitbox if any(hitbox) else None))
+
+    trees = [reader.unpack('<dBI') for _ in range(reader.unpack('<I')[0])]
+    return SaveState(money, items, seeds, sky_color, bool(raining), (width, height), cells,
+                     plants, trees)
+
+def restore(level, state):
+    player, soil_layer = level.player, level.soil_layer
+    player.money = state.money
+    player.item_inventory.update((name, amount) for name, amount in state.items.items()
+                                 if name in player.item_inventory)
+    player.seed_inventory.update((name, amount) for name, amount in state.seeds.items()
+                                 if name in player.seed_inventory)
+    level.sky.start_color = list(state.sky_color)
+    level.raining = soil_layer.raining = state.raining
+
+    # a save made against a different map keeps the player but not the world
+    if state.grid_size == (soil_layer.grid.width, soil_layer.grid.height):
+        soil_layer.restore(state.cells, state.plants)
+        level.restore_trees(state.trees)
+
+def write_save(path, payload):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+    # written next to the old save and swapped in, a crash mid-write keeps the last good one
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(struct.pack(SAVE_HEADER, SAVE_MAGIC, SAVE_VERSION))
+        file.write(zlib.compress(payload))
+    os.replace(temp_path, path)
+
+def read_save(path):
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(struct.calcsize(SAVE_HEADER))
+            data = file.read()
+    except OSError:
+        return None
+    if len(header) != struct.calcsize(SAVE_HEADER):
+        return None
+    magic, version = struct.unpack(SAVE_HEADER, header)
+    if magic != SAVE_MAGIC or version != SAVE_VERSION:
+        return None
+    try:
+        return decode(zlib.decompress(data))
+    except (zlib.error, struct.error, ValueError, IndexError, UnicodeDecodeError):
+        return None
+
+class Autosave:
+    def __init__(self, path = SAVE_PATH):
+        self.path = path
+        self.queue = Queue()
+        self.thread = None
+        self.error = None
+        self.enabled = True
+
+    def save(self, level):
+        if not self.enabled:
+            return
+        payload = snapshot(level)
+        if self.thread is None:
+            self.thread = Thread(target = self.work, name = 'autosave', daemon = True)
+            self.thread.start()
+        self.queue.put(payload)
+
+    def work(self):
+        # compression and the disk write happen here, off the frame
+        while True:
+            payload = self.queue.get()
+            try:
+                write_save(self.path, payload)
+                self.error = None
+            except OSError as error:
+                self.error = error
+            self.queue.task_done()
+
+    def flush(self):
+        # waits for queued saves, called before the game exits
+        self.queue.join()
+        self.check()
+
+    def check(self):
+        # the worker only records a failed write, it's reported from the main thread
+        error, self.error = self.error, None
+        if error is not None:
+            print(f'autosave to {self.path} failed: {error}', file = sys.stderr)
+        return error
+
+    def load(self, level):
+        state = read_save(self.path)
+        if state is None:
+            # an old version or a damaged file is kept aside, the next autosave would replace it
+            if os.path.exists(self.path):
+                self.back_up()
+            return False
+        restore(level, state)
+        return True
+
+    def back_up(self):
+        backup, number = self.path + '.bak', 1
+        while os.path.exists(backup):
+            backup, number = f'{self.path}.{number}.bak', number + 1
+        try:
+            os.replace(self.path, backup)
+        except OSError as error:
+            # never written over, this session just isn't saved
+            self.enabled = False
+            print(f'could not read {self.path} or move it aside, autosave is off: {error}',
+                  file = sys.stderr)
+            return
+        print(f'could not read {self.path}, starting a new farm, the old save is {backup}',
+              file = sys.stderr)
@@ -1,10 +1,69 @@
 from pygame.math import Vector2
+from pygame.locals import K_F3, K_F4
 
 #Screen
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
 
+# bake static tile layers into chunk surfaces instead of one sprite per tile
+STATIC_CHUNKS = False
+CHUNK_SIZE = 512
+
+# stream the map in square chunks of tiles around the player instead of building it all up front
+WORLD_STREAMING = False
+STREAM_CHUNK_TILES = 16
+STREAM_RADIUS = 1
+
+# rendered text surfaces kept by the shared text cache
+TEXT_CACHE_SIZE = 256
+
+# sky tint lightmap downscale factor, 1 fills the tint at screen resolution
+TINT_LIGHTMAP_SCALE = 1
+
+# byte budget for the shared asset cache, None keeps every asset loaded
+ASSET_CACHE_BYTES = None
+
+# frame folders packed by tools/build_atlases.py, loose files are read when an atlas is missing or stale
+ATLAS_FOLDERS = ['../graphics/character', '../graphics/fruit', '../graphics/soil',
+                 '../graphics/soil_water', '../graphics/water', '../graphics/rain']
+ATLAS_VERSION = 1
+
+# decoding threads shared by startup and streamed ground, files converted between two loading
+# screen redraws and the longest the loading screen waits for a decode before redrawing, in seconds
+LOADER_WORKERS = 4
+LOADER_BATCH = 8
+LOADER_INTERVAL = 1 / 30
+
+# soil grid flags
+FARMABLE = 1
+TILLED = 2
+WATERED = 4
+PLANTED = 8
+
+# soil autotile variant for each neighbour mask (top 1, right 2, bottom 4, left 8)
+SOIL_TILE_TYPES = ('o', 'b', 'l', 'bl', 't', 'tb', 'tl', 'tbr',
+                   'r', 'br', 'lr', 'lrb', 'tr', 'tbl', 'lrt', 'x')
+
+# headless simulation, fixed timestep and ticks between day rollovers
+HEADLESS_DT = 1 / 60
+HEADLESS_TICKS_PER_DAY = 3600
+
+# map and its pre-rendered ground, a map can point at its own ground with a 'ground' property
+MAP_PATH = '../data/map.tmx'
+GROUND_PATH = '../graphics/world/ground.png'
+
+# save file, rewritten in the background at every day rollover
+SAVE_PATH = '../saves/farm.sav'
+
+# debug profiler overlay, bottom left corner next to the tool overlay
+PROFILER_TOGGLE_KEY = K_F3
+PROFILER_CAPTURE_KEY = K_F4
+PROFILER_CAPTURE_FRAMES = 300
+PROFILER_HISTORY = 120
+PROFILER_OUTPUT = '../profiles'
+PROFILER_POSITION = (120, SCREEN_HEIGHT - 10)
+
 #Overlay positions
 OVERLAY_POSITIONS = {
     'tool' : (40, SCREEN_HEIGHT - 15),
@@ -32,6 +91,38 @@ LAYERS = {
     'rain drops' : 10
 }
 
+# grid the camera files sprites that don't move in, only cells under the view are drawn
+CAMERA_CELL_SIZE = 256
+
+# rain, emitted per second over the area around the camera
+RAIN_DROPS_PER_SECOND = 300
+RAIN_FLOOR_PER_SECOND = 300
+RAIN_LIFETIME = (400, 500)
+RAIN_MARGIN = 256
+
+# particle silhouettes kept around and dead particles kept for reuse
+PARTICLE_CACHE_SIZE = 64
+PARTICLE_POOL_SIZE = 32
+
+# player animation frames per second, a tool swing is one pass of its animation
+PLAYER_ANIMATION_SPEED = 4
+
+# per axe swing, about the old per-frame rates at 60 fps
+AXE_DAMAGE = 0.3
+APPLE_DROP_CHANCE = 15
+
+# background music, streamed from disk instead of decoded into memory
+MUSIC_PATH = '../audio/bg.mp3'
+
+# effects: file, channels reserved for it and the shortest gap between two starts in ms
+SOUNDS = {
+    'axe' : ('../audio/axe.mp3', 2, 100),
+    'hoe' : ('../audio/hoe.wav', 2, 100),
+    'water' : ('../audio/water.mp3', 1, 250),
+    'plant' : ('../audio/plant.wav', 2, 100),
+    'success' : ('../audio/success.wav', 2, 50)
+}
+
 APPLE_POS = {
     'Small' : [(18, 17), (30, 37), (12, 50), (30, 45), (20, 30), (30, 10)],
     'Large' : [(30, 24), (60, 65), (50 ,50), (16, 40), (45, 50), (42, 70)]
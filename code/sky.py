@@ -1,59 +1,137 @@
 import pygame
 from settings import *
 from support import import_folder
-from sprites import Generic
-from random import randint, choice
-from timer import Timer
+from random import randint
+from array import array
 
 class Sky:
     def __init__(self):
-        self.display_sruface = pygame.display.get_surface()
-        self.full_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.start_color = [255,255,255]
         self.end_color = [38,101,189]
 
-    def display(self, dt):
+    def update(self, dt):
         for index, value in enumerate(self.end_color):
             if self.start_color[index] > value:
                 self.start_color[index] -= 2 * dt
 
-        self.full_surf.fill(self.start_color)
-        self.display_sruface.blit(self.full_surf, (0,0), special_flags= pygame.BLEND_RGBA_MULT)
+class Tint:
+    def __init__(self, scale = TINT_LIGHTMAP_SCALE):
+        self.display_surface = pygame.display.get_surface()
+        self.full_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        # low resolution lightmap, scaled up into full_surf whenever it changes
+        self.scale = scale
+        if self.scale > 1:
+            self.light_surf = pygame.Surface((SCREEN_WIDTH // scale, SCREEN_HEIGHT // scale))
+        self.color = None
+
+    def refill(self, color):
+        self.color = color
+        if self.scale > 1:
+            self.light_surf.fill(color)
+            pygame.transform.scale(self.light_surf, (SCREEN_WIDTH, SCREEN_HEIGHT), self.full_surf)
+        else:
+            self.full_surf.fill(color)
 
-class Drop(Generic):
-    def __init__(self, surf, pos, moving, groups, z):
-        super().__init__(pos, surf, groups, z)
-        self.lifetime = randint(400, 500)
-        self.start_time = pygame.time.get_ticks()
+    def display(self, sky_color, brightness = 255):
+        # sky colour and transition fade merged into one multiply pass
+        color = tuple(int(value * brightness / 255) for value in sky_color)
+        if color == (255, 255, 255):
+            return
+        if color != self.color:
+            self.refill(color)
+        self.display_surface.blit(self.full_surf, (0,0), special_flags= pygame.BLEND_RGBA_MULT)
 
-        self.moving = moving
-        if self.moving is True:
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2,4)
-            self.speed = randint(200,250)
+class RainEmitter:
+    def __init__(self, frames, rate, velocity = (0, 0), speed = (0, 0)):
+        self.frames = frames
+        self.rate = rate
+        self.velocity = velocity
+        self.speed = speed
+        self.time = 0
+        self.pending = 0
 
-    def update(self, dt):
-        if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
-        if pygame.time.get_ticks() - self.start_time >= self.lifetime:
-            self.kill()
+        # one entry per drop, expired drops are dropped from the front in batches
+        self.head = 0
+        self.x = array('d')
+        self.y = array('d')
+        self.vx = array('d')
+        self.vy = array('d')
+        self.born = array('d')
+        self.death = array('d')
+        self.frame = array('B')
+
+    def __len__(self):
+        return len(self.x) - self.head
+
+    def emit(self, dt, area):
+        self.pending += self.rate * dt
+        count = int(self.pending)
+        self.pending -= count
+        if count <= 0 or area.width <= 0 or area.height <= 0:
+            return
+
+        for _ in range(count):
+            speed = randint(*self.speed)
+            self.x.append(randint(area.left, area.right))
+            self.y.append(randint(area.top, area.bottom))
+            self.vx.append(self.velocity[0] * speed)
+            self.vy.append(self.velocity[1] * speed)
+            self.born.append(self.time)
+            self.death.append(self.time + randint(*RAIN_LIFETIME) / 1000)
+            self.frame.append(randint(0, len(self.frames) - 1))
+
+    def expire(self):
+        # lifetimes only vary by RAIN_LIFETIME, so the oldest drops sit at the front
+        oldest = self.time - RAIN_LIFETIME[1] / 1000
+        born, head, end = self.born, self.head, len(self.born)
+        while head < end and born[head] <= oldest:
+            head += 1
+        self.head = head
+        if head > 256 and head * 2 > end:
+            for values in (self.x, self.y, self.vx, self.vy, self.born, self.death, self.frame):
+                del values[:head]
+            self.head = 0
+
+    def update(self, dt, area = None):
+        self.time += dt
+        if area is not None:
+            self.emit(dt, area)
+        self.expire()
+
+    def draw(self, surface, view):
+        time, frames = self.time, self.frames
+        left, top, right, bottom = view.left, view.top, view.right, view.bottom
+        x, y, vx, vy, born, death, frame = (self.x, self.y, self.vx, self.vy,
+                                            self.born, self.death, self.frame)
+        batch = []
+        for index in range(self.head, len(x)):
+            if death[index] <= time:
+                continue
+            age = time - born[index]
+            pos_x = round(x[index] + vx[index] * age)
+            pos_y = round(y[index] + vy[index] * age)
+            if left - 32 < pos_x < right and top - 32 < pos_y < bottom:
+                batch.append((frames[frame[index]], (pos_x - left, pos_y - top)))
+        if batch:
+            surface.blits(batch, False)
 
 class Rain:
-    def __init__(self, all_sprites):
+    def __init__(self, all_sprites, map_size):
         self.all_sprites = all_sprites
         self.rain_drops = import_folder('../graphics/rain/drops/')
         self.rain_floor = import_folder('../graphics/rain/floor/')
-        self.floor_w, self.floor_h = pygame.image.load('../graphics/world/ground.png').get_size()
-
-    def create_floor(self):
-        Drop(choice(self.rain_floor), (randint(0, self.floor_w), randint(0, self.floor_h)), False,
-             self.all_sprites, LAYERS['rain floor'])
-    def create_drops(self):
-        Drop(choice(self.rain_drops), (randint(0, self.floor_w), randint(0, self.floor_h)), True,
-             self.all_sprites, LAYERS['rain drops'])
+        self.floor_w, self.floor_h = map_size
 
-    def update(self):
-        self.create_floor()
-        self.create_drops()
+        self.floor = RainEmitter(self.rain_floor, RAIN_FLOOR_PER_SECOND)
+        self.drops = RainEmitter(self.rain_drops, RAIN_DROPS_PER_SECOND, (-2, 4), (200, 250))
+        self.all_sprites.attach(LAYERS['rain floor'], self.floor)
+        self.all_sprites.attach(LAYERS['rain drops'], self.drops)
 
+    def update(self, dt, raining = True):
+        area = None
+        if raining:
+            # only emit around the camera, padded so drops can drift in from outside the view
+            area = self.all_sprites.view.inflate(RAIN_MARGIN * 2, RAIN_MARGIN * 2)
+            area = area.clip(pygame.Rect(0, 0, self.floor_w, self.floor_h))
+        self.floor.update(dt, area)
+        self.drops.update(dt, area)
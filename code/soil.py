@@ -1,7 +1,8 @@
 import pygame
 from settings import *
-from pytmx.util_pygame import load_pygame
+from tilemap import load_map
 from support import *
+from audio import audio
 from random import randint, choice
 
 class SoilTile(pygame.sprite.Sprite):
@@ -33,171 +34,299 @@ class Plant(pygame.sprite.Sprite):
         self.harvestable = False
 
         self.image = self.frames[self.age]
-        self.y_offset = -16 if plant_type == 'corn' else -8
+        self.y_offset = self.offset(plant_type)
         self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom
                                                   + pygame.math.Vector2(0, self.y_offset))
         self.z = LAYERS['ground plant']
 
+    @staticmethod
+    def offset(plant_type):
+        return -16 if plant_type == 'corn' else -8
+
 
     def grow(self):
         if self.check_watered(self.rect.center):
-            self.age += self.grow_speed
+            self.set_age(self.age + self.grow_speed)
 
-            if int(self.age) > 0:
-                self.z = LAYERS['main']
-                self.hitbox = self.rect.copy().inflate(-26,-self.rect.height*0.4)
+    def set_age(self, age):
+        self.age = age
 
-            if self.age >= self.max_age:
-                self.age = self.max_age
-                self.harvestable = True
+        if int(self.age) > 0:
+            self.z = LAYERS['main']
+            self.hitbox = self.rect.copy().inflate(-26,-self.rect.height*0.4)
 
-            self.image = self.frames[int(self.age)]
-            self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom
-                                                  + pygame.math.Vector2(0, self.y_offset))
+        if self.age >= self.max_age:
+            self.age = self.max_age
+            self.harvestable = True
+
+        self.image = self.frames[int(self.age)]
+        self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom
+                                              + pygame.math.Vector2(0, self.y_offset))
+
+class SoilGrid:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # one byte per tile, one bit per flag
+        self.cells = bytearray(width * height)
+        self.tables = {}
+
+    def table(self, name, flag, func):
+        key = (name, flag)
+        if key not in self.tables:
+            self.tables[key] = bytes(func(value) for value in range(256))
+        return self.tables[key]
+
+    def get(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x]
+        return 0
+
+    def has(self, x, y, flag):
+        return bool(self.get(x, y) & flag)
+
+    def set(self, x, y, flag):
+        self.cells[y * self.width + x] |= flag
+
+    def clear(self, x, y, flag):
+        self.cells[y * self.width + x] &= ~flag
+
+    def find(self, mask):
+        # mask is a 0/1 byte per cell, bytes.find does the scanning in C
+        index = mask.find(1)
+        while index != -1:
+            yield index % self.width, index // self.width
+            index = mask.find(1, index + 1)
+
+    def positions(self, flag):
+        return self.find(self.cells.translate(self.table('has', flag, lambda value: value & flag and 1)))
+
+    def count(self, flag):
+        return self.cells.translate(self.table('has', flag, lambda value: value & flag and 1)).count(1)
+
+    def clear_all(self, flag):
+        self.cells = self.cells.translate(self.table('clear', flag, lambda value: value & ~flag))
+
+    def set_where(self, flag, condition):
+        # sets flag on every cell with condition and returns the cells that changed
+        changed = self.cells.translate(self.table(
+            'missing', (flag, condition),
+            lambda value: 1 if value & condition and not value & flag else 0))
+        self.cells = self.cells.translate(self.table(
+            'set', (flag, condition),
+            lambda value: value | flag if value & condition else value))
+        return list(self.find(changed))
 
 class SoilLayer:
-    def __init__(self, all_sprites, collision_sprites):
+    def __init__(self, all_sprites, collision_sprites, map_path = MAP_PATH):
         self.all_sprites = all_sprites
+        self.map_path = map_path
         self.soil_sprites = pygame.sprite.Group()
         self.water_sprites = pygame.sprite.Group()
         self.plant_sptires = pygame.sprite.Group()
+
+        # (col, row) -> sprite indexes
+        self.soil_tiles = {}
+        self.water_tiles = {}
+        self.plants = {}
         self.collision_sprites = collision_sprites
 
+        # streamed worlds only keep sprites for loaded chunks, plants elsewhere are
+        # (col, row) -> (plant type, age, hitbox)
+        self.world = None
+        self.dormant = {}
+
         self.soil_surfaces = import_folder_dict('../graphics/soil/')
         self.water_surfaces = import_folder('../graphics/soil_water')
 
         self.create_soil_grid()
-        self.create_hit_rects()
-
-        self.hoe_sound = pygame.mixer.Sound('../audio/hoe.wav')
-        self.plant_sound = pygame.mixer.Sound('../audio/plant.wav')
 
     def create_soil_grid(self):
-        ground = pygame.image.load('../graphics/world/ground.png')
-        h_tiles, v_tiles = ground.get_width() // TILE_SIZE, ground.get_height() // TILE_SIZE
-
-        self.grid = [[[] for col in range(h_tiles)] for row in range(v_tiles)]
-        for x, y, _ in load_pygame('../data/map.tmx').get_layer_by_name('Farmable').tiles():
-            self.grid[y][x].append('F')
-
-    def create_hit_rects(self):
-        self.hit_rects = []
-        for index_row, row in enumerate(self.grid):
-            for index_coll, cell in enumerate(row):
-                if 'F' in cell:
-                    x = index_coll * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    rect = pygame.Rect(x, y, TILE_SIZE, TILE_SIZE)
-                    self.hit_rects.append(rect)
+        # sized from the map, the ground image can be far too large to load just for its size
+        tmx_data = load_map(self.map_path)
+        self.grid = SoilGrid(tmx_data.width, tmx_data.height)
+        for x, y, _ in tmx_data.tiles('Farmable'):
+            self.grid.set(x, y, FARMABLE)
+
+    def loaded(self, col, row):
+        return self.world is None or self.world.tile_loaded(col, row)
+
+    def get_cell(self, pos):
+        return int(pos[0] // TILE_SIZE), int(pos[1] // TILE_SIZE)
 
     def get_hit(self, point):
-        for rect in self.hit_rects:
-            if rect.collidepoint(point):
-                self.hoe_sound.play()
-
-                x = rect.x // TILE_SIZE
-                y = rect.y // TILE_SIZE
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X')
-                    self.create_soil_tiles()
-                    if self.raining:
-                        self.water_all()
-
-    def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell:
-                    t = 'X' in self.grid[index_row - 1][index_col]
-                    r = 'X' in row[index_col + 1]
-                    l = 'X' in row[index_col - 1]
-                    b = 'X' in self.grid[index_row + 1][index_col]
-
-                    tile_type = 'o'
-
-                    if all((t,r,b,l)):
-                        tile_type = 'x'
-
-                    if l and not any((t,r,b)):
-                        tile_type = 'l'
-                    if r and not any((t,l,b)):
-                        tile_type = 'r'
-                    if any((l,r)) and not any((t,b)):
-                        tile_type = 'lr'
-
-                    if t and not any((r,l,b)):
-                        tile_type = 't'
-                    if b and not any ((r,l,t)):
-                        tile_type = 'b'
-                    if any((t,b)) and not any((l,r)):
-                        tile_type = 'tb'
-
-                    if any((l,b)) and not any ((t,r)):
-                        tile_type = 'tr'
-                    if any((l,t)) and not any ((b,r)):
-                        tile_type = 'br'
-                    if any((r,b)) and not any ((t,l)):
-                        tile_type = 'tl'
-                    if any((r,t)) and not any ((b,l)):
-                        tile_type = 'bl'
-
-                    if all((t,b,r)) and not l:
-                        tile_type = 'tbr'
-                    if all((t,b,l)) and not r:
-                        tile_type = 'tbl'
-                    if all((l,r,t)) and not b:
-                        tile_type = 'lrb'
-                    if all((l,r,b)) and not t:
-                        tile_type = 'lrt'
-
-                    SoilTile((index_col * TILE_SIZE, index_row * TILE_SIZE),
-                             self.soil_surfaces[tile_type], [self.all_sprites, self.soil_sprites])
+        x, y = self.get_cell(point)
+        if not self.grid.has(x, y, FARMABLE):
+            return
+        audio.play('hoe')
+
+        if not self.grid.has(x, y, TILLED):
+            self.grid.set(x, y, TILLED)
+            self.create_soil_tiles(x, y)
+            if self.raining:
+                self.water_all()
+
+    def tile_mask(self, col, row):
+        return (self.grid.has(col, row - 1, TILLED)
+                | self.grid.has(col + 1, row, TILLED) << 1
+                | self.grid.has(col, row + 1, TILLED) << 2
+                | self.grid.has(col - 1, row, TILLED) << 3)
+
+    def update_soil_tile(self, col, row):
+        if not self.grid.has(col, row, TILLED) or not self.loaded(col, row):
+            return
+        surf = self.soil_surfaces[SOIL_TILE_TYPES[self.tile_mask(col, row)]]
+        soil_tile = self.soil_tiles.get((col, row))
+        if soil_tile is None:
+            self.soil_tiles[(col, row)] = SoilTile((col * TILE_SIZE, row * TILE_SIZE), surf,
+                                                   [self.all_sprites, self.soil_sprites])
+        elif soil_tile.image is not surf:
+            soil_tile.image = surf
+
+    def create_soil_tiles(self, col, row):
+        # only the changed tile and its 4 neighbours can change variant
+        for x, y in ((col, row), (col, row - 1), (col + 1, row), (col, row + 1), (col - 1, row)):
+            self.update_soil_tile(x, y)
+
+    def create_water_tile(self, col, row):
+        self.water_tiles[(col, row)] = WaterTile((col * TILE_SIZE, row * TILE_SIZE),
+                                                 choice(self.water_surfaces),
+                                                 [self.all_sprites, self.water_sprites])
 
     def water(self, target_pos):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                self.grid[y][x].append('W')
-                WaterTile(soil_sprite.rect.topleft, choice(self.water_surfaces),
-                          [self.all_sprites, self.water_sprites])
+        cell = self.get_cell(target_pos)
+        if cell not in self.soil_tiles or cell in self.water_tiles:
+            return
+        self.grid.set(*cell, WATERED)
+        self.create_water_tile(*cell)
 
     def plant_seed(self, target_pos, seed):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                self.plant_sound.play()
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                if 'P' not in self.grid[y][x]:
-                    self.grid[y][x].append('P')
-                    Plant(seed, [self.all_sprites, self.collision_sprites, self.plant_sptires] ,soil_sprite, self.check_watered)
+        cell = self.get_cell(target_pos)
+        soil_tile = self.soil_tiles.get(cell)
+        if soil_tile is None:
+            return
+        audio.play('plant')
+        if not self.grid.has(*cell, PLANTED):
+            self.grid.set(*cell, PLANTED)
+            self.plants[cell] = Plant(seed, [self.all_sprites, self.collision_sprites, self.plant_sptires],
+                                      soil_tile, self.check_watered)
+
+    def harvestable_plants(self, rect):
+        # plants stand 16px up into the row above their soil tile
+        plants = []
+        for row in range(rect.top // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE + 2):
+            for col in range(rect.left // TILE_SIZE, (rect.right - 1) // TILE_SIZE + 1):
+                plant = self.plants.get((col, row))
+                if plant is not None and plant.harvestable and plant.rect.colliderect(rect):
+                    plants.append(plant)
+        return plants
+
+    def remove_plant(self, plant):
+        cell = self.get_cell(plant.soil.rect.topleft)
+        if self.plants.get(cell) is not plant:
+            return
+        del self.plants[cell]
+        self.grid.clear(*cell, PLANTED)
+        plant.kill()
 
     def water_all(self):
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    x = index_col * TILE_SIZE
-                    y = index_row * TILE_SIZE
-                    WaterTile((x,y), choice(self.water_surfaces), [self.all_sprites,
-                                                                   self.water_sprites])
+        for col, row in self.grid.set_where(WATERED, TILLED):
+            if self.loaded(col, row):
+                self.create_water_tile(col, row)
 
     def remove_water(self):
         for sprite in self.water_sprites.sprites():
             sprite.kill()
+        self.water_tiles.clear()
 
-        for row in self.grid:
-            for cell in row:
-                if 'W' in cell:
-                    cell.remove('W')
+        self.grid.clear_all(WATERED)
 
     def check_watered(self, pos):
         x = pos[0] // TILE_SIZE
         y = pos[1] // TILE_SIZE
-        cell = self.grid[y][x]
-        is_watered = 'W' in cell
-        return is_watered
+        return self.grid.has(x, y, WATERED)
+
+    def restore(self, cells, plants):
+        # rebuilds the layer from a save in one pass instead of replaying hoe, water and seed hits
+        for sprite in self.soil_sprites.sprites() + self.water_sprites.sprites() + self.plant_sptires.sprites():
+            sprite.kill()
+        self.soil_tiles.clear()
+        self.water_tiles.clear()
+        self.plants.clear()
+        self.dormant.clear()
+
+        self.grid.cells = bytearray(cells)
+        for col, row in self.grid.positions(TILLED):
+            self.update_soil_tile(col, row)
+        for col, row in self.grid.positions(WATERED):
+            if self.loaded(col, row):
+                self.create_water_tile(col, row)
+
+        for col, row, plant_type, age, hitbox in plants:
+            if self.loaded(col, row):
+                self.revive_plant((col, row), plant_type, age, hitbox)
+            elif self.grid.has(col, row, TILLED):
+                self.dormant[(col, row)] = (plant_type, age, hitbox and pygame.Rect(hitbox))
+
+    def revive_plant(self, cell, plant_type, age, hitbox):
+        soil_tile = self.soil_tiles.get(cell)
+        if soil_tile is None:
+            return
+        plant = Plant(plant_type, [self.all_sprites, self.collision_sprites, self.plant_sptires],
+                      soil_tile, self.check_watered)
+        plant.set_age(age)
+        # the hitbox lags a growth stage behind, so it is kept rather than recomputed
+        if hitbox:
+            plant.hitbox = pygame.Rect(hitbox)
+        self.plants[cell] = plant
+
+    def plant_states(self):
+        for (col, row), plant in self.plants.items():
+            yield col, row, plant.plant_type, plant.age, getattr(plant, 'hitbox', None)
+        for (col, row), (plant_type, age, hitbox) in self.dormant.items():
+            yield col, row, plant_type, age, hitbox
+
+    def load_region(self, left, top, right, bottom):
+        # builds the sprites of a chunk that was streamed in, plants come back from dormant
+        for row in range(top, bottom):
+            for col in range(left, right):
+                value = self.grid.get(col, row)
+                if not value & TILLED:
+                    continue
+                self.update_soil_tile(col, row)
+                if value & WATERED:
+                    self.create_water_tile(col, row)
+                if (col, row) in self.dormant:
+                    self.revive_plant((col, row), *self.dormant.pop((col, row)))
+
+    def unload_region(self, left, top, right, bottom):
+        for row in range(top, bottom):
+            for col in range(left, right):
+                cell = (col, row)
+                if cell in self.soil_tiles:
+                    self.soil_tiles.pop(cell).kill()
+                if cell in self.water_tiles:
+                    self.water_tiles.pop(cell).kill()
+                if cell in self.plants:
+                    plant = self.plants.pop(cell)
+                    self.dormant[cell] = (plant.plant_type, plant.age, getattr(plant, 'hitbox', None))
+                    plant.kill()
+
+    def grow_dormant(self):
+        # same growth as Plant.grow without building the sprite
+        for (col, row), (plant_type, age, hitbox) in self.dormant.items():
+            frames = import_folder(f'../graphics/fruit/{plant_type}')
+            soil_bottom = ((col + 0.5) * TILE_SIZE, (row + 1) * TILE_SIZE + Plant.offset(plant_type))
+            rect = frames[int(age)].get_rect(midbottom = soil_bottom)
+            if not self.check_watered(rect.center):
+                continue
+            if int(age + GROW_SPEED[plant_type]) > 0:
+                hitbox = rect.inflate(-26, -rect.height*0.4)
+            age = min(age + GROW_SPEED[plant_type], len(frames) - 1)
+            self.dormant[(col, row)] = (plant_type, age, hitbox)
 
     def update_plants(self):
         for plant in self.plant_sptires.sprites():
             plant.grow()
+            self.collision_sprites.refresh(plant)
+        self.grow_dormant()
@@ -1,7 +1,11 @@
 import pygame
 from settings import *
 from random import randint, choice
-from timer import Timer
+from collections import OrderedDict
+from timer import Timer, scheduler
+from animation import clocks
+from support import import_image
+from audio import audio
 
 class Generic(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups, z=LAYERS['main']):
@@ -11,28 +15,38 @@ class Generic(pygame.sprite.Sprite):
         self.z = z
         self.hitbox = self.rect.copy().inflate(-self.rect.width*0.2, -self.rect.height*0.75)
 
+    def refresh_hitbox(self):
+        for group in self.groups():
+            if hasattr(group, 'refresh'):
+                group.refresh(self)
+
 class Interaction(Generic):
     def __init__(self, pos, size, groups, name):
         surf = pygame.Surface(size)
         super().__init__(pos, surf, groups)
         self.name = name
 
-class Water(Generic):
-    def __init__(self, pos, frames, groups):
-        self.frames = frames
-        self.frame_index = 0
+class Animated(Generic):
+    # takes its frame from a clock shared with every sprite showing the same frames,
+    # the image is read only and assigning it raises
+    def __init__(self, pos, frames, groups, z, speed, phase = 0):
+        self.clock = clocks.get(frames, speed)
+        self.phase = phase
+        # Generic would assign the image, so the sprite is set up here
+        pygame.sprite.Sprite.__init__(self, groups)
+        self.rect = frames[0].get_rect(topleft = pos)
+        self.z = z
+        self.hitbox = self.rect.copy().inflate(-self.rect.width*0.2, -self.rect.height*0.75)
 
-        super().__init__(pos = pos, surf = self.frames[self.frame_index], groups = groups,
-                         z = LAYERS['water'])
+    @property
+    def image(self):
+        # only on-screen sprites get drawn, so reading the image keeps the clock running
+        self.clock.visible = True
+        return self.clock.frame(self.phase)
 
-    def animate(self, dt):
-        self.frame_index += 5 * dt
-        if self.frame_index >= len(self.frames):
-            self.frame_index = 0
-        self.image = self.frames[int(self.frame_index)]
-
-    def update(self, dt):
-        self.animate(dt)
+class Water(Animated):
+    def __init__(self, pos, frames, groups, phase = 0):
+        super().__init__(pos, frames, groups, LAYERS['water'], 5, phase)
 
 class WildFlower(Generic):
     def __init__(self, pos, surf, groups):
@@ -40,15 +54,19 @@ class WildFlower(Generic):
         self.hitbox = self.rect.copy().inflate(-20, -self.rect.height*0.9)
 
 class Tree(Generic):
+    max_health = 10
+
     def __init__(self, pos, surf, groups, name, player_add):
         super().__init__(pos, surf, groups)
+        self.all_sprites = groups[0]
 
-        self.health = 10
+        self.health = self.max_health
         self.alive = True
-        self.stump_surf = pygame.image.load(f'../graphics/stumps/{name}.png').convert_alpha()
+        self.stump_surf = import_image(f'../graphics/stumps/{name.lower()}.png')
         self.invul_timer = Timer(200)
 
-        self.apple_surf = pygame.image.load('../graphics/fruit/apple.png')
+        self.apple_surf = import_image('../graphics/fruit/apple.png')
+        self.name = name
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
 
@@ -56,15 +74,13 @@ class Tree(Generic):
 
         self.player_add = player_add
 
-        self.axe_sound = pygame.mixer.Sound('../audio/axe.mp3')
-
     def damage(self):
-        self.health = self.health - 0.01
-        self.axe_sound.play()
-        if len(self.apple_sprites.sprites()) <= 0 or randint(0, 1000) > 5:
+        self.health = self.health - AXE_DAMAGE
+        audio.play('axe')
+        if len(self.apple_sprites.sprites()) <= 0 or randint(1, 100) > APPLE_DROP_CHANCE:
             return
         random_apple = choice(self.apple_sprites.sprites())
-        Particle(random_apple.rect.topleft, random_apple.image, self.groups()[0], LAYERS['fruit'])
+        Particle.spawn(random_apple.rect.topleft, random_apple.image, self.all_sprites, LAYERS['fruit'])
         random_apple.kill()
         self.player_add('apple')
 
@@ -72,11 +88,8 @@ class Tree(Generic):
     def check_death(self):
         if self.health >= 0:
             return
-        self.alive = False
-        Particle(self.rect.topleft, self.image, self.groups()[0], LAYERS['main'])
-        self.image = self.stump_surf
-        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
-        self.hitbox = self.rect.copy().inflate(-10, -self.rect.height*0.6)
+        Particle.spawn(self.rect.topleft, self.image, self.all_sprites, LAYERS['main'])
+        self.become_stump()
         self.player_add('wood')
         for apple in self.apple_sprites.sprites():
             apple.kill()
@@ -87,28 +100,94 @@ class Tree(Generic):
             return
         self.check_death()
 
-    def create_fruit(self):
-        for pos in self.apple_pos:
+    def become_stump(self):
+        self.alive = False
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate(-10, -self.rect.height*0.6)
+        self.refresh_hitbox()
+
+    @staticmethod
+    def roll_fruit(name):
+        # bit per apple position that grows an apple today
+        slots = 0
+        for slot in range(len(APPLE_POS[name])):
             if randint(0, 10) > 8:
                 continue
-            x = self.rect.left + pos[0]
-            y = self.rect.top + pos[1]
-            Generic((x, y), self.apple_surf, [self.apple_sprites, self.groups()[0]],
-                    z=LAYERS['fruit'])
+            slots |= 1 << slot
+        return slots
+
+    def create_fruit(self):
+        slots = self.roll_fruit(self.name)
+        for slot in range(len(self.apple_pos)):
+            if slots & 1 << slot:
+                self.create_apple(slot)
+
+    def create_apple(self, slot):
+        x = self.rect.left + self.apple_pos[slot][0]
+        y = self.rect.top + self.apple_pos[slot][1]
+        apple = Generic((x, y), self.apple_surf, [self.apple_sprites, self.all_sprites],
+                        z=LAYERS['fruit'])
+        apple.slot = slot
+
+    def apple_slots(self):
+        # bit per apple position that still has an apple
+        return sum(1 << apple.slot for apple in self.apple_sprites)
+
+    def restore(self, health, alive, apple_slots):
+        self.health = health
+        if self.alive and not alive:
+            self.become_stump()
+        for apple in self.apple_sprites.sprites():
+            apple.kill()
+        for slot in range(len(self.apple_pos)):
+            if apple_slots & 1 << slot:
+                self.create_apple(slot)
+
+class SilhouetteCache:
+    def __init__(self, max_entries = PARTICLE_CACHE_SIZE):
+        self.max_entries = max_entries
+        # id(surf) -> (surf, silhouette), the source is kept so its id can't be reused
+        self.entries = OrderedDict()
+
+    def get(self, surf):
+        entry = self.entries.get(id(surf))
+        if entry is not None and entry[0] is surf:
+            self.entries.move_to_end(id(surf))
+            return entry[1]
+
+        silhouette = pygame.mask.from_surface(surf).to_surface()
+        silhouette.set_colorkey((0,0,0))
+        self.entries[id(surf)] = (surf, silhouette)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+        return silhouette
 
 class Particle(Generic):
+    silhouettes = SilhouetteCache()
+    pool = []
+
     def __init__(self, pos, surf, groups, z, duration = 200):
         super().__init__(pos, surf, groups, z)
-        self.start_time = pygame.time.get_ticks()
+        self.setup(pos, surf, z, duration)
+
+    @classmethod
+    def spawn(cls, pos, surf, groups, z, duration = 200):
+        if not cls.pool:
+            return cls(pos, surf, groups, z, duration)
+        particle = cls.pool.pop()
+        particle.setup(pos, surf, z, duration)
+        particle.add(groups)
+        return particle
+
+    def setup(self, pos, surf, z, duration):
+        self.image = self.silhouettes.get(surf)
+        self.rect = self.image.get_rect(topleft = pos)
+        self.z = z
         self.duration = duration
+        scheduler.call_later(duration, self.expire)
 
-        mask_surf = pygame.mask.from_surface(self.image)
-        new_surf = mask_surf.to_surface()
-        new_surf.set_colorkey((0,0,0))
-        self.image = new_surf
-
-    def update(self, dt):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time < self.duration:
-            return
+    def expire(self):
         self.kill()
+        if len(self.pool) < PARTICLE_POOL_SIZE:
+            self.pool.append(self)
@@ -1,24 +1,246 @@
-from os import walk
+import json
+from os import sep, stat, walk
+from os.path import join, normpath, relpath
+from collections import OrderedDict
 import pygame
+from settings import *
 
-def import_folder(path: str):
-    surface_list = []
+class AssetCache:
+    def __init__(self, max_bytes = None):
+        self.max_bytes = max_bytes
+        # off for headless runs and benchmarks, audio.py then plays through its null backend
+        self.audio = True
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # frame lists, atlases and maps, kept outside the byte budget with every asset they hold pinned
+        self.containers = {}
+        self.pinned = set()
+        self.loading = []
+        self.hits = 0
+        self.misses = 0
 
-    for _, __, img_files in walk(path):
-        for img in img_files:
-            full_path = path + '/' + img
-            img_surf = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(img_surf)
+    def get(self, key, load, size):
+        if self.loading:
+            self.loading[-1].add(key)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
 
-    return surface_list
+        self.misses += 1
+        return self.put(key, load(), size)
 
-def import_folder_dict(path):
-    surface_dict = {}
+    def put(self, key, asset, size):
+        nbytes = size(asset)
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (asset, nbytes)
+        self.bytes += nbytes
+        self.evict()
+        return asset
+
+    def container(self, key, load):
+        if key in self.containers:
+            self.hits += 1
+            return self.containers[key]
+
+        self.misses += 1
+        self.loading.append(set())
+        try:
+            asset = load()
+        finally:
+            keys = self.loading.pop()
+        # a dropped surface would be decoded again while the container still holds the old one
+        self.pinned |= keys
+        if self.loading:
+            self.loading[-1] |= keys
+        self.containers[key] = asset
+        return asset
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        # least recently used first, never the asset that was just loaded or one a container holds
+        newest = next(reversed(self.entries), None)
+        for key in [key for key in self.entries if key != newest and key not in self.pinned]:
+            if self.bytes <= self.max_bytes:
+                break
+            self.bytes -= self.entries.pop(key)[1]
+
+    def surface(self, path, alpha = True):
+        path = normpath(path)
+        def load():
+            surf = pygame.image.load(path)
+            return surf.convert_alpha() if alpha else surf.convert()
+        return self.get(('surface', path, alpha), load, surface_bytes)
+
+    def add_surface(self, path, surf, alpha = True):
+        # decoded by the loader's threads, the conversion needs the display and runs here
+        surf = surf.convert_alpha() if alpha else surf.convert()
+        return self.put(('surface', normpath(path), alpha), surf, surface_bytes)
+
+    def add_sound(self, path, sound):
+        return self.put(('sound', normpath(path)), sound, sound_bytes)
+
+    def sound(self, path):
+        path = normpath(path)
+        return self.get(('sound', path), lambda: pygame.mixer.Sound(path), sound_bytes)
+
+    def folder(self, path):
+        path = normpath(path)
+        return self.container(('folder', path), lambda: load_folder(path))
+
+    def folder_dict(self, path):
+        path = normpath(path)
+        return self.container(('folder dict', path), lambda: load_folder_dict(path))
+
+    def atlas(self, folder):
+        # None is cached too, a missing or stale atlas is only checked once
+        folder = normpath(folder)
+        return self.container(('atlas', folder), lambda: load_atlas(folder))
+
+    def clear(self):
+        self.entries.clear()
+        self.containers.clear()
+        self.pinned.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'containers': len(self.containers),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit rate': self.hits / lookups if lookups else 0
+        }
+
+class TextCache:
+    def __init__(self, max_entries = TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        if isinstance(color, list):
+            color = tuple(color)
+        key = (font, text, antialias, color)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self.entries[key] = surf
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+        return surf
 
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit rate': self.hits / lookups if lookups else 0
+        }
+
+def surface_bytes(surf):
+    return surf.get_pitch() * surf.get_height()
+
+def sound_bytes(sound):
+    mixer = pygame.mixer.get_init()
+    if not mixer:
+        return 0
+    frequency, size, channels = mixer
+    return int(sound.get_length() * frequency) * (abs(size) // 8) * channels
+
+assets = AssetCache(ASSET_CACHE_BYTES)
+text_cache = TextCache(TEXT_CACHE_SIZE)
+
+def frame_key(name):
+    # numbered frames in number order, named ones after them alphabetically
+    stem = name.split('.')[0]
+    return (0, int(stem), '') if stem.isdigit() else (1, 0, stem)
+
+def frame_files(path):
+    # the folder's own files, walk order depends on the file system
     for _, __, img_files in walk(path):
-        for img in img_files:
-            full_path = path + '/' + img
-            img_surf = pygame.image.load(full_path).convert_alpha()
-            surface_dict[img.split('.')[0]] = img_surf
+        return sorted(img_files, key = frame_key)
+    return []
+
+def atlas_paths(folder):
+    folder = normpath(folder)
+    return folder + '.atlas.png', folder + '.atlas.json'
+
+def atlas_current(folder, folders):
+    for name, frames in folders.items():
+        path = join(folder, name)
+        if frame_files(path) != [frame[0] for frame in frames]:
+            return False
+        for img, x, y, w, h, mtime, size in frames:
+            info = stat(join(path, img))
+            if (info.st_mtime_ns, info.st_size) != (mtime, size):
+                return False
+    return True
+
+def read_atlas_index(folder):
+    # None unless the atlas was built by this version from the files on disk now
+    try:
+        with open(atlas_paths(folder)[1]) as file:
+            index = json.load(file)
+        if index.get('version') != ATLAS_VERSION or not atlas_current(folder, index['folders']):
+            return None
+    except (OSError, ValueError):
+        return None
+    return index
+
+def load_atlas(folder):
+    index = read_atlas_index(folder)
+    if index is None:
+        return None
+    try:
+        atlas = assets.surface(atlas_paths(folder)[0])
+    except (OSError, pygame.error):
+        return None
+    # subfolder -> frames by file name without extension, in frame order
+    return {name: {img.split('.')[0]: atlas.subsurface((x, y, w, h))
+                   for img, x, y, w, h, _, __ in frames}
+            for name, frames in index['folders'].items()}
 
-    return surface_dict
+def atlas_frames(path):
+    # None when the folder isn't packed and has to be read file by file
+    for folder in ATLAS_FOLDERS:
+        folder = normpath(folder)
+        if path == folder or path.startswith(folder + sep):
+            atlas = assets.atlas(folder)
+            return atlas.get(relpath(path, folder)) if atlas else None
+    return None
+
+def load_folder(path):
+    frames = atlas_frames(path)
+    if frames is not None:
+        return list(frames.values())
+    return [assets.surface(path + '/' + img) for img in frame_files(path)]
+
+def load_folder_dict(path):
+    frames = atlas_frames(path)
+    if frames is not None:
+        return dict(frames)
+    return {img.split('.')[0]: assets.surface(path + '/' + img) for img in frame_files(path)}
+
+def import_image(path: str, alpha = True):
+    return assets.surface(path, alpha)
+
+def render_text(font, text, antialias, color):
+    return text_cache.render(font, text, antialias, color)
+
+def import_folder(path: str):
+    return list(assets.folder(path))
+
+def import_folder_dict(path):
+    return dict(assets.folder_dict(path))
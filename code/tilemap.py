@@ -0,0 +1,264 @@
+import pygame, struct, zlib
+from array import array
+from hashlib import sha1
+from os import stat
+from os.path import basename, dirname, join, normpath
+from xml.etree import ElementTree
+from settings import *
+from support import assets
+from save import Reader, Writer
+
+MAP_CACHE_MAGIC = b'FGMC'
+MAP_CACHE_VERSION = 3
+MAP_CACHE_HEADER = '<4sH'
+MAP_ATLAS_WIDTH = 1024
+
+class MapObject:
+    def __init__(self, x, y, width, height, name, image):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.name = name
+        self.image = image
+
+class CompiledMap:
+    def __init__(self, width, height, layers, objects, images, ground = GROUND_PATH):
+        self.width = width
+        self.height = height
+        self.ground = ground
+        # tile layers hold one image index + 1 per cell, 0 is empty
+        self.layers = layers
+        self.objects_by_layer = objects
+        self.images = images
+
+    def tiles(self, layer):
+        images, width = self.images, self.width
+        for index, value in enumerate(self.layers[layer]):
+            if value:
+                yield index % width, index // width, images[value - 1]
+
+    def tiles_in(self, layer, left, top, right, bottom):
+        images, width, tiles = self.images, self.width, self.layers[layer]
+        for y in range(top, bottom):
+            for x in range(left, right):
+                value = tiles[y * width + x]
+                if value:
+                    yield x, y, images[value - 1]
+
+    def objects(self, layer):
+        return self.objects_by_layer[layer]
+
+def map_sources(tmx_path):
+    # the map, its tilesets and the tileset images all feed into the cache
+    sources = [tmx_path]
+    for tileset in ElementTree.parse(tmx_path).getroot().iter('tileset'):
+        if 'source' not in tileset.attrib:
+            continue
+        tsx_path = normpath(join(dirname(tmx_path), tileset.attrib['source']))
+        sources.append(tsx_path)
+        for image in ElementTree.parse(tsx_path).getroot().iter('image'):
+            sources.append(normpath(join(dirname(tsx_path), image.attrib['source'])))
+    return sources
+
+def file_signature(path, digest = True):
+    info = stat(path)
+    signature = [info.st_mtime_ns, info.st_size, None]
+    if digest:
+        with open(path, 'rb') as file:
+            signature[2] = sha1(file.read()).hexdigest()
+    return signature
+
+def signature_matches(path, signature):
+    try:
+        current = file_signature(path, digest = False)
+    except OSError:
+        return False
+    if current[:2] == signature[:2]:
+        return True
+    # touched but possibly unchanged, fall back to the content hash
+    return file_signature(path)[2] == signature[2]
+
+def pack_atlas(surfaces):
+    # simple shelf packer, tallest images first
+    order = sorted(range(len(surfaces)), key = lambda index: -surfaces[index].get_height())
+    rects = [None] * len(surfaces)
+    x = y = shelf_height = 0
+    for index in order:
+        w, h = surfaces[index].get_size()
+        if x + w > MAP_ATLAS_WIDTH:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        rects[index] = (x, y, w, h)
+        x += w
+        shelf_height = max(shelf_height, h)
+
+    atlas = pygame.Surface((MAP_ATLAS_WIDTH, max(y + shelf_height, 1)), pygame.SRCALPHA)
+    for surf, rect in zip(surfaces, rects):
+        atlas.blit(surf, rect[:2])
+    return atlas, rects
+
+def compile_map(tmx_path, cache_path, atlas_path):
+    from pytmx import TiledTileLayer
+    from pytmx.util_pygame import load_pygame
+
+    tmx_data = load_pygame(tmx_path)
+    surfaces, surface_index = [], {}
+
+    def image_index(surf):
+        if surf is None:
+            return 0
+        if id(surf) not in surface_index:
+            surfaces.append(surf)
+            surface_index[id(surf)] = len(surfaces)
+        return surface_index[id(surf)]
+
+    layers, objects = {}, {}
+    for layer in tmx_data.layers:
+        if isinstance(layer, TiledTileLayer):
+            layers[layer.name] = array('H', (image_index(tmx_data.images[gid]) if gid else 0
+                                             for row in layer.data for gid in row))
+        else:
+            objects[layer.name] = [(obj.x, obj.y, obj.width, obj.height, obj.name,
+                                    image_index(obj.image)) for obj in layer]
+
+    atlas, rects = pack_atlas(surfaces)
+
+    data = {
+        'sources': {path: file_signature(path) for path in map_sources(tmx_path)},
+        'width': tmx_data.width,
+        'height': tmx_data.height,
+        'atlas': basename(atlas_path),
+        'ground': tmx_data.properties.get('ground'),
+        'rects': rects,
+        'layers': {name: tiles.tobytes() for name, tiles in layers.items()},
+        'objects': objects
+    }
+    try:
+        pygame.image.save(atlas, atlas_path)
+        with open(cache_path, 'wb') as file:
+            file.write(encode_cache(data))
+    except (OSError, pygame.error):
+        # read-only data folder, keep the compiled map in memory only
+        pass
+    return data, atlas.convert_alpha()
+
+def encode_cache(data):
+    # plain records like the save files, a cache shipped next to a map can't run code when read
+    writer = Writer()
+    writer.pack(MAP_CACHE_HEADER, MAP_CACHE_MAGIC, MAP_CACHE_VERSION)
+    # sources stay uncompressed in front, a stale cache is rejected before the rest is unpacked
+    writer.pack('<H', len(data['sources']))
+    for path, (mtime, size, digest) in data['sources'].items():
+        writer.string(path, '<H')
+        writer.pack('<qq20s', mtime, size, bytes.fromhex(digest))
+    header = writer.getvalue()
+
+    writer = Writer()
+    writer.pack('<II', data['width'], data['height'])
+    writer.string(data['atlas'], '<H')
+    writer.string(data['ground'] or '', '<H')
+    writer.pack('<I', len(data['rects']))
+    for rect in data['rects']:
+        writer.pack('<4i', *rect)
+    writer.pack('<B', len(data['layers']))
+    for name, tiles in data['layers'].items():
+        writer.string(name)
+        writer.pack('<I', len(tiles))
+        writer.parts.append(tiles)
+    writer.pack('<B', len(data['objects']))
+    for name, layer_objects in data['objects'].items():
+        writer.string(name)
+        writer.pack('<I', len(layer_objects))
+        for x, y, width, height, obj_name, index in layer_objects:
+            writer.pack('<4dBI', x, y, width, height, obj_name is not None, index)
+            writer.string(obj_name or '')
+    return header + zlib.compress(writer.getvalue())
+
+def decode_cache(payload):
+    reader = Reader(payload)
+    data = {}
+    data['width'], data['height'] = reader.unpack('<II')
+    data['atlas'] = reader.string('<H')
+    data['ground'] = reader.string('<H') or None
+    data['rects'] = [reader.unpack('<4i') for _ in range(reader.unpack('<I')[0])]
+    data['layers'] = {}
+    for _ in range(reader.unpack('<B')[0]):
+        name = reader.string()
+        data['layers'][name] = reader.bytes(reader.unpack('<I')[0])
+    data['objects'] = {}
+    for _ in range(reader.unpack('<B')[0]):
+        name = reader.string()
+        layer_objects = data['objects'][name] = []
+        for _ in range(reader.unpack('<I')[0]):
+            x, y, width, height, named, index = reader.unpack('<4dBI')
+            obj_name = reader.string()
+            layer_objects.append((x, y, width, height, obj_name if named else None, index))
+    return data
+
+def read_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as file:
+            cache = file.read()
+    except OSError:
+        return None
+    reader = Reader(cache)
+    try:
+        magic, version = reader.unpack(MAP_CACHE_HEADER)
+        if magic != MAP_CACHE_MAGIC or version != MAP_CACHE_VERSION:
+            return None
+        sources = {}
+        for _ in range(reader.unpack('<H')[0]):
+            path = reader.string('<H')
+            mtime, size, digest = reader.unpack('<qq20s')
+            sources[path] = [mtime, size, digest.hex()]
+        for path, signature in sources.items():
+            if not signature_matches(path, signature):
+                return None
+        data = decode_cache(zlib.decompress(cache[reader.offset:]))
+    except (zlib.error, struct.error, ValueError, UnicodeDecodeError):
+        return None
+    data['sources'] = sources
+    try:
+        atlas = assets.surface(join(dirname(cache_path), data['atlas']))
+    except (FileNotFoundError, pygame.error):
+        return None
+    return data, atlas
+
+def build_map(data, atlas, tmx_path):
+    images = [atlas.subsurface(rect) for rect in data['rects']]
+
+    def image(index):
+        return images[index - 1] if index else None
+
+    layers = {}
+    for name, tiles in data['layers'].items():
+        layers[name] = array('H')
+        layers[name].frombytes(tiles)
+    objects = {name: [MapObject(x, y, width, height, obj_name, image(index))
+                      for x, y, width, height, obj_name, index in layer_objects]
+               for name, layer_objects in data['objects'].items()}
+    # the ground property is relative to the map file
+    ground = normpath(join(dirname(tmx_path), data['ground'])) if data['ground'] else GROUND_PATH
+    return CompiledMap(data['width'], data['height'], layers, objects, images, ground)
+
+def map_ground(tmx_path):
+    # read before the map is loaded, map properties come ahead of the layers
+    for _, element in ElementTree.iterparse(tmx_path, events = ('start',)):
+        if element.tag == 'property' and element.get('name') == 'ground':
+            return normpath(join(dirname(tmx_path), element.get('value')))
+        if element.tag in ('layer', 'objectgroup'):
+            break
+    return GROUND_PATH
+
+def load_compiled_map(tmx_path):
+    tmx_path = normpath(tmx_path)
+    cache_path, atlas_path = tmx_path + '.cache', tmx_path + '.atlas.png'
+    cached = read_cache(cache_path)
+    if cached is None:
+        cached = compile_map(tmx_path, cache_path, atlas_path)
+    return build_map(*cached, tmx_path)
+
+def load_map(tmx_path):
+    # shared per process, Level and SoilLayer read the same map
+    return assets.container(('map', normpath(tmx_path)), lambda: load_compiled_map(tmx_path))
@@ -1,4 +1,44 @@
-import pygame
+from heapq import heappush, heappop
+from itertools import count
+
+class ScheduledCall:
+    def __init__(self, deadline, func):
+        self.deadline = deadline
+        self.func = func
+
+    def cancel(self):
+        # left in the queue and skipped when it comes up
+        self.func = None
+
+    @property
+    def pending(self):
+        return self.func is not None
+
+class Scheduler:
+    def __init__(self):
+        # game time in milliseconds, advanced by the level every frame
+        self.now = 0
+        self.queue = []
+        self.order = count()
+
+    def call_later(self, delay, func):
+        call = ScheduledCall(self.now + delay, func)
+        heappush(self.queue, (call.deadline, next(self.order), call))
+        return call
+
+    def advance(self, dt):
+        self.now += dt * 1000
+        queue = self.queue
+        while queue and queue[0][0] <= self.now:
+            call = heappop(queue)[2]
+            func, call.func = call.func, None
+            if func is not None:
+                func()
+
+    def get_ticks(self):
+        return self.now
+
+scheduler = Scheduler()
 
 class Timer:
     def __init__(self, duration, func = None):
@@ -6,19 +46,25 @@ class Timer:
         self.func = func
         self.start_time = 0
         self.active = False
+        self.call = None
 
     def activate(self):
+        if self.call is not None:
+            self.call.cancel()
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = scheduler.now
+        self.call = scheduler.call_later(self.duration, self.expire)
 
     def deactivate(self):
+        if self.call is not None:
+            self.call.cancel()
+            self.call = None
         self.active = False
         self.start_time = 0
 
-    def update(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time < self.duration:
-            return
-        if self.func and self.start_time != 0:
-            self.func()
+    def expire(self):
+        self.call = None
+        # deactivated first so the callback can start the timer again
         self.deactivate()
+        if self.func:
+            self.func()
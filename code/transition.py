@@ -1,19 +1,16 @@
-import pygame
 from settings import *
 
 class Transition:
     def __init__(self, reset, player):
         # setup
-        self.display_surface = pygame.display.get_surface()
         self.reset = reset
         self.player = player
 
-        # overlay image
-        self.image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        # brightness applied by the level tint
         self.color = 255
         self.speed = -2
 
-    def play(self):
+    def update(self):
         self.color += self.speed
 
         if self.color <= 0:
@@ -25,6 +22,3 @@ class Transition:
             self.speed = -2
             self.player.sleep = False
 
-        self.image.fill((self.color, self.color, self.color))
-        self.display_surface.blit(self.image, (0,0), special_flags=pygame.BLEND_RGBA_MULT)
-
@@ -0,0 +1,261 @@
+import pygame
+from collections import OrderedDict
+from math import ceil
+from os import makedirs
+from os.path import exists, getmtime, join, splitext
+from settings import *
+from sprites import Generic, Water, WildFlower, Tree
+from support import import_folder
+from loader import pool
+
+# written last when splitting, pieces without it are from an interrupted split
+GROUND_CHUNKS_MARKER = 'complete'
+
+def ground_chunk_folder(path, size):
+    return f'{splitext(path)[0]}_chunks_{size}'
+
+class GroundTiles:
+    def __init__(self, path, size, keep = None):
+        self.path = path
+        self.size = size
+        self.folder = ground_chunk_folder(path, size)
+        # in memory pieces, only used when the split can't be written next to the image,
+        # then the whole ground stays loaded and nothing below applies
+        self.pieces = None
+        # converted pieces, least recently used first, kept outside the shared asset cache
+        # so pieces of unloaded chunks are let go once more than keep are around, None keeps all
+        self.cache = OrderedDict()
+        self.keep = keep
+        # pieces decoding on the loader pool
+        self.decoding = {}
+        if not self.up_to_date():
+            self.split()
+
+    def up_to_date(self):
+        # generated worlds too large for one image only ship the pieces
+        marker = join(self.folder, GROUND_CHUNKS_MARKER)
+        if not exists(marker):
+            return False
+        return not exists(self.path) or getmtime(marker) >= getmtime(self.path)
+
+    def split(self):
+        # the one time the whole image is loaded, later runs read single pieces
+        ground = pygame.image.load(self.path)
+        pieces = {}
+        for top in range(0, ground.get_height(), self.size):
+            for left in range(0, ground.get_width(), self.size):
+                rect = pygame.Rect(left, top, self.size, self.size).clip(ground.get_rect())
+                pieces[(left // self.size, top // self.size)] = ground.subsurface(rect).copy()
+        try:
+            makedirs(self.folder, exist_ok = True)
+            for (x, y), piece in pieces.items():
+                pygame.image.save(piece, join(self.folder, f'{x}_{y}.png'))
+            open(join(self.folder, GROUND_CHUNKS_MARKER), 'w').close()
+        except (OSError, pygame.error):
+            self.pieces = {key: piece.convert_alpha() for key, piece in pieces.items()}
+
+    def piece_path(self, key):
+        return join(self.folder, f'{key[0]}_{key[1]}.png')
+
+    def prefetch(self, keys):
+        if self.pieces is not None:
+            return
+        keys = set(keys)
+        # the player moved on before these started
+        for key in list(self.decoding):
+            if key not in keys and self.decoding[key].cancel():
+                del self.decoding[key]
+        for key in keys:
+            if key in self.cache or key in self.decoding or not exists(self.piece_path(key)):
+                continue
+            self.decoding[key] = pool.submit(pygame.image.load, self.piece_path(key))
+
+    def poll(self):
+        # one finished decode converted per frame, ahead of the frame that needs it
+        for key, decode in self.decoding.items():
+            if decode.done():
+                del self.decoding[key]
+                self.store(key, decode)
+                return
+
+    def store(self, key, decode):
+        try:
+            surf = decode.result().convert_alpha()
+        except (OSError, pygame.error):
+            return None
+        self.cache[key] = surf
+        while self.keep is not None and len(self.cache) > self.keep:
+            self.cache.popitem(last = False)
+        return surf
+
+    def piece(self, x, y):
+        key = (x, y)
+        if self.pieces is not None:
+            return self.pieces.get(key)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        decode = self.decoding.pop(key, None)
+        if decode is None:
+            if not exists(self.piece_path(key)):
+                return None
+            # not prefetched, e.g. the first chunks around the player
+            decode = pool.submit(pygame.image.load, self.piece_path(key))
+        return self.store(key, decode)
+
+class World:
+    def __init__(self, level, tmx_data, size = STREAM_CHUNK_TILES, radius = STREAM_RADIUS):
+        self.level = level
+        self.tmx_data = tmx_data
+        self.size = size
+        self.radius = radius
+        self.columns = ceil(tmx_data.width / size)
+        self.rows = ceil(tmx_data.height / size)
+
+        # the loaded chunks and the ring around them that is decoded ahead
+        self.ground = GroundTiles(tmx_data.ground, size * TILE_SIZE, (2 * radius + 3) ** 2)
+        self.water_frames = import_folder('../graphics/water')
+
+        # map objects bucketed by chunk, trees are identified by their index in the map
+        self.objects = {}
+        for layer in ['Trees', 'Decoration']:
+            for index, obj in enumerate(tmx_data.objects(layer)):
+                self.objects.setdefault((layer, self.chunk_at(obj.x, obj.y)), []).append((index, obj))
+        self.tree_names = [obj.name for obj in tmx_data.objects('Trees')]
+
+        # chunk -> (sprites, static hitboxes) created for it
+        self.loaded = {}
+        # trees outside the loaded chunks, index -> (health, alive, apple slots)
+        self.trees = {}
+        self.center = None
+
+        level.soil_layer.world = self
+
+    def chunk_at(self, x, y):
+        span = self.size * TILE_SIZE
+        return int(x // span), int(y // span)
+
+    def tile_loaded(self, col, row):
+        return (col // self.size, row // self.size) in self.loaded
+
+    def bounds(self, chunk):
+        left, top = chunk[0] * self.size, chunk[1] * self.size
+        return (left, top, min(left + self.size, self.tmx_data.width),
+                min(top + self.size, self.tmx_data.height))
+
+    def around(self, center, radius):
+        return {(x, y)
+                for y in range(center[1] - radius, center[1] + radius + 1)
+                for x in range(center[0] - radius, center[0] + radius + 1)
+                if 0 <= x < self.columns and 0 <= y < self.rows}
+
+    def update(self, pos):
+        self.ground.poll()
+        center = self.chunk_at(*pos)
+        if center == self.center:
+            return
+        self.center = center
+
+        # the next ring decodes in the background, crossing into it only converts,
+        # chunks needed right away start decoding together too
+        self.ground.prefetch(self.around(center, self.radius + 1))
+        wanted = self.around(center, self.radius)
+        for chunk in sorted(self.loaded.keys() - wanted):
+            self.unload(chunk)
+        for chunk in sorted(wanted - self.loaded.keys()):
+            self.load(chunk)
+
+    def load(self, chunk):
+        level, tmx_data = self.level, self.tmx_data
+        left, top, right, bottom = self.bounds(chunk)
+        sprites, hitboxes = [], []
+        self.loaded[chunk] = (sprites, hitboxes)
+
+        def tiles(layer):
+            for x, y, surf in tmx_data.tiles_in(layer, left, top, right, bottom):
+                yield (x * TILE_SIZE, y * TILE_SIZE), surf
+
+        # ground
+        ground_surf = self.ground.piece(*chunk)
+        if ground_surf:
+            sprites.append(Generic((left * TILE_SIZE, top * TILE_SIZE), ground_surf, level.all_sprites,
+                                   LAYERS['ground']))
+
+        # house
+        for layer in ['HouseFloor', 'HouseFurnitureBottom']:
+            for pos, surf in tiles(layer):
+                sprites.append(Generic(pos, surf, level.all_sprites, LAYERS['house bottom']))
+        for layer in ['HouseWalls', 'HouseFurnitureTop']:
+            for pos, surf in tiles(layer):
+                sprites.append(Generic(pos, surf, level.all_sprites))
+
+        # fence
+        for pos, surf in tiles('Fence'):
+            sprites.append(Generic(pos, surf, [level.all_sprites, level.collision_sprites]))
+
+        # water
+        for pos, surf in tiles('Water'):
+            sprites.append(Water(pos, self.water_frames, level.all_sprites))
+
+        # trees
+        for index, obj in self.objects.get(('Trees', chunk), ()):
+            tree = Tree((obj.x, obj.y), obj.image,
+                        [level.all_sprites, level.collision_sprites, level.tree_sprites], obj.name,
+                        level.player_add)
+            tree.map_index = index
+            if index in self.trees:
+                tree.restore(*self.trees.pop(index))
+            sprites.append(tree)
+
+        # wildflowers
+        for index, obj in self.objects.get(('Decoration', chunk), ()):
+            sprites.append(WildFlower((obj.x, obj.y), obj.image,
+                                      [level.all_sprites, level.collision_sprites]))
+
+        # collision tiles
+        for x, y, surf in tmx_data.tiles_in('Collision', left, top, right, bottom):
+            rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+            hitbox = rect.inflate(-rect.width*0.2, -rect.height*0.75)
+            level.collision_sprites.add_static(hitbox)
+            hitboxes.append(hitbox)
+
+        level.soil_layer.load_region(left, top, right, bottom)
+
+    def unload(self, chunk):
+        level = self.level
+        level.soil_layer.unload_region(*self.bounds(chunk))
+        sprites, hitboxes = self.loaded.pop(chunk)
+        for sprite in sprites:
+            if isinstance(sprite, Tree):
+                self.trees[sprite.map_index] = (sprite.health, sprite.alive, sprite.apple_slots())
+                for apple in sprite.apple_sprites.sprites():
+                    apple.kill()
+            sprite.kill()
+        for hitbox in hitboxes:
+            level.collision_sprites.remove_static(hitbox)
+
+    def regrow_fruit(self):
+        for index, (health, alive, _) in self.trees.items():
+            self.trees[index] = (health, alive, Tree.roll_fruit(self.tree_names[index]))
+
+    def tree_states(self):
+        # every tree in map order, trees never streamed in get their first day's apples now
+        live = {tree.map_index: tree for tree in self.level.tree_sprites}
+        states = []
+        for index, name in enumerate(self.tree_names):
+            if index in live:
+                tree = live[index]
+                states.append((tree.health, tree.alive, tree.apple_slots()))
+                continue
+            if index not in self.trees:
+                self.trees[index] = (Tree.max_health, True, Tree.roll_fruit(name))
+            states.append(self.trees[index])
+        return states
+
+    def restore_trees(self, states):
+        live = {tree.map_index: tree for tree in self.level.tree_sprites}
+        for index, state in enumerate(states):
+            if index in live:
+                live[index].restore(*state)
+            else:
+                self.trees[index] = tuple(state)
@@ -0,0 +1,47 @@
+import os, json, argparse
+
+# before pygame and the game modules, see game_env
+import game_env
+
+import pygame
+from settings import *
+from support import atlas_paths, frame_files
+from tilemap import pack_atlas
+
+def build_atlas(folder):
+    folder = os.path.normpath(folder)
+    surfaces, files = [], {}
+    for path, _, __ in sorted(os.walk(folder)):
+        name = os.path.relpath(path, folder)
+        for img in frame_files(path):
+            surfaces.append(pygame.image.load(os.path.join(path, img)))
+            files.setdefault(name, []).append(img)
+
+    atlas, rects = pack_atlas(surfaces)
+    rects = iter(rects)
+    folders = {}
+    for name, imgs in files.items():
+        folders[name] = []
+        for img in imgs:
+            info = os.stat(os.path.join(folder, name, img))
+            folders[name].append([img, *next(rects), info.st_mtime_ns, info.st_size])
+
+    image_path, index_path = atlas_paths(folder)
+    pygame.image.save(atlas, image_path)
+    # the index goes last, an interrupted build leaves no index pointing at a half written image
+    with open(index_path, 'w') as file:
+        json.dump({'version': ATLAS_VERSION, 'folders': folders}, file)
+    return len(surfaces), len(folders), atlas.get_size()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Pack the Farm Game frame folders into atlases')
+    parser.add_argument('folders', nargs = '*', default = ATLAS_FOLDERS,
+                        help = 'folders to pack, relative to the code folder, all of ATLAS_FOLDERS by default')
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        frames, folders, (width, height) = build_atlas(folder)
+        print(f'{folder}: {frames} frames from {folders} folders, {width}x{height}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import os, sys
+
+# imported first by the scripts in tools/ and benchmarks/, runs the game without a window or audio device
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code')
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+# asset paths in the game are relative to the code folder
+START_DIR = os.getcwd()
+os.chdir(CODE_DIR)
+sys.path.insert(0, CODE_DIR)
+
+def from_start_dir(path):
+    # command line paths are relative to where the script was started
+    return os.path.join(START_DIR, path) if path else None
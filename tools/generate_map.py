@@ -0,0 +1,305 @@
+import os, math, random, argparse
+from collections import Counter
+from xml.etree import ElementTree
+
+# before pygame and the game modules, see game_env
+from game_env import from_start_dir
+
+import pygame
+from settings import *
+from save import SaveState, encode, write_save
+from sprites import Tree
+from world import GROUND_CHUNKS_MARKER, ground_chunk_folder
+
+TILE_LAYERS = ['Water', 'Ground', 'Fence', 'HouseFloor', 'HouseWalls', 'HouseFurnitureBottom',
+               'HouseFurnitureTop', 'Collision', 'Farmable']
+HIDDEN_LAYERS = {'Water', 'Collision', 'Farmable'}
+# tiles around the player start that are kept free
+START_CLEARING = 4
+
+class Template:
+    # tilesets, gids and object sizes taken from the hand made map
+    def __init__(self, tmx_path):
+        root = ElementTree.parse(tmx_path).getroot()
+        folder = os.path.dirname(os.path.abspath(tmx_path))
+        self.tilesets = [(int(tileset.attrib['firstgid']),
+                          os.path.normpath(os.path.join(folder, tileset.attrib['source'])))
+                         for tileset in root.iter('tileset')]
+
+        layers = {layer.attrib['name']: [int(gid) for gid in layer.find('data').text.split(',')]
+                  for layer in root.iter('layer')}
+        def most_common(name):
+            return Counter(gid for gid in layers[name] if gid).most_common(1)[0][0]
+        self.ground_gid = most_common('Ground')
+        self.water_gid = most_common('Water')
+        self.collision_gid = most_common('Collision')
+        self.farmable_gid = most_common('Farmable')
+
+        groups = {group.attrib['name']: list(group) for group in root.iter('objectgroup')}
+        self.trees = sorted({(obj.attrib['name'], int(obj.attrib['gid']), float(obj.attrib['width']),
+                              float(obj.attrib['height'])) for obj in groups['Trees']})
+        self.decorations = sorted({(int(obj.attrib['gid']), float(obj.attrib['width']),
+                                    float(obj.attrib['height'])) for obj in groups['Decoration']})
+        self.interactions = {obj.attrib['name']: (float(obj.attrib['width']), float(obj.attrib['height']))
+                             for obj in groups['Player'] if 'width' in obj.attrib}
+
+    def tile_image(self, gid):
+        firstgid, path = max((tileset for tileset in self.tilesets if tileset[0] <= gid),
+                             key = lambda tileset: tileset[0])
+        tileset = ElementTree.parse(path).getroot()
+        width, height = int(tileset.attrib['tilewidth']), int(tileset.attrib['tileheight'])
+        columns = int(tileset.attrib['columns'])
+        image_path = os.path.join(os.path.dirname(path), tileset.find('image').attrib['source'])
+        index = gid - firstgid
+        rect = pygame.Rect(index % columns * width, index // columns * height, width, height)
+        return pygame.image.load(image_path).subsurface(rect).copy()
+
+class MapPlan:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.layers = {name: [0] * (width * height) for name in TILE_LAYERS}
+        # tiles taken by water, fields, rocks, trees and decoration
+        self.used = bytearray(width * height)
+        self.objects = {'Trees': [], 'Decoration': [], 'Player': []}
+        self.start = (width // 2, height // 2)
+        for row in range(self.start[1] - START_CLEARING, self.start[1] + START_CLEARING + 1):
+            for col in range(self.start[0] - START_CLEARING, self.start[0] + START_CLEARING + 1):
+                if 0 <= col < width and 0 <= row < height:
+                    self.used[row * width + col] = 1
+
+    def free(self, left, top, width, height):
+        if left < 0 or top < 0 or left + width > self.width or top + height > self.height:
+            return False
+        return not any(self.used[row * self.width + left:row * self.width + left + width].count(1)
+                       for row in range(top, top + height))
+
+    def fill(self, layers, left, top, width, height):
+        for row in range(top, top + height):
+            for col in range(left, left + width):
+                index = row * self.width + col
+                self.used[index] = 1
+                for name, gid in layers:
+                    self.layers[name][index] = gid
+
+    def count(self, name):
+        return sum(1 for gid in self.layers[name] if gid)
+
+def place_areas(plan, layers, target, sizes, attempts):
+    # rectangles (ponds, fields) until the layer covers its target tile count
+    name = layers[0][0]
+    covered = 0
+    for _ in range(attempts):
+        if covered >= target:
+            break
+        width, height = random.randint(*sizes[0]), random.randint(*sizes[1])
+        left, top = random.randrange(plan.width), random.randrange(plan.height)
+        width, height = min(width, target - covered), min(height, max(1, (target - covered) // width))
+        if plan.free(left, top, width, height):
+            plan.fill(layers, left, top, width, height)
+            covered += width * height
+    return plan.count(name)
+
+def place_objects(plan, layer, templates, count, attempts):
+    placed = 0
+    for _ in range(attempts):
+        if placed >= count:
+            break
+        col, row = random.randrange(plan.width), random.randrange(plan.height)
+        if not plan.free(col, row, 1, 1):
+            continue
+        template = random.choice(templates)
+        plan.used[row * plan.width + col] = 1
+        plan.objects[layer].append((col * TILE_SIZE, row * TILE_SIZE, template))
+        placed += 1
+
+def generate(template, width, height, densities):
+    plan = MapPlan(width, height)
+    tiles = width * height
+    attempts = tiles * 4
+
+    # ponds block movement like the water in the hand made map
+    place_areas(plan, [('Water', template.water_gid), ('Collision', template.collision_gid)],
+                int(tiles * densities['water']), ((3, 8), (3, 6)), attempts)
+    rocks = int(tiles * densities['collision']) - plan.count('Collision')
+    if rocks > 0:
+        place_areas(plan, [('Collision', template.collision_gid)], rocks, ((1, 1), (1, 1)), attempts)
+    place_areas(plan, [('Farmable', template.farmable_gid)], int(tiles * densities['farmable']),
+                ((4, 10), (3, 6)), attempts)
+
+    place_objects(plan, 'Trees', template.trees, int(tiles * densities['trees']), attempts)
+    place_objects(plan, 'Decoration', template.decorations, int(tiles * densities['decoration']),
+                  attempts)
+
+    ground = plan.layers['Ground']
+    water = plan.layers['Water']
+    for index in range(tiles):
+        if not water[index]:
+            ground[index] = template.ground_gid
+
+    start_x, start_y = (plan.start[0] + 0.5) * TILE_SIZE, (plan.start[1] + 0.5) * TILE_SIZE
+    plan.objects['Player'].append(('Start', start_x, start_y, None))
+    bed_w, bed_h = template.interactions['Bed']
+    plan.objects['Player'].append(('Bed', start_x - 3 * TILE_SIZE, start_y - TILE_SIZE, (bed_w, bed_h)))
+    trader_w, trader_h = template.interactions['Trader']
+    plan.objects['Player'].append(('Trader', start_x + 2 * TILE_SIZE, start_y - 2 * TILE_SIZE,
+                                   (trader_w, trader_h)))
+    return plan
+
+def write_tmx(path, plan, template, ground_file):
+    folder = os.path.dirname(os.path.abspath(path))
+    root = ElementTree.Element('map', {
+        'version': '1.8', 'tiledversion': '1.8.6', 'orientation': 'orthogonal',
+        'renderorder': 'right-down', 'width': str(plan.width), 'height': str(plan.height),
+        'tilewidth': str(TILE_SIZE), 'tileheight': str(TILE_SIZE), 'infinite': '0'})
+    properties = ElementTree.SubElement(root, 'properties')
+    ElementTree.SubElement(properties, 'property', {'name': 'ground', 'value': ground_file})
+    for firstgid, source in template.tilesets:
+        ElementTree.SubElement(root, 'tileset', {'firstgid': str(firstgid),
+                                                 'source': os.path.relpath(source, folder)})
+
+    layer_id = 0
+    for name in TILE_LAYERS:
+        layer_id += 1
+        attributes = {'id': str(layer_id), 'name': name, 'width': str(plan.width),
+                      'height': str(plan.height)}
+        if name in HIDDEN_LAYERS:
+            attributes['visible'] = '0'
+        layer = ElementTree.SubElement(root, 'layer', attributes)
+        gids = plan.layers[name]
+        rows = (','.join(map(str, gids[row * plan.width:(row + 1) * plan.width]))
+                for row in range(plan.height))
+        ElementTree.SubElement(layer, 'data', {'encoding': 'csv'}).text = '\n' + ',\n'.join(rows) + '\n'
+
+    object_id = 0
+    for name in ['Trees', 'Decoration']:
+        layer_id += 1
+        group = ElementTree.SubElement(root, 'objectgroup', {'id': str(layer_id), 'name': name})
+        for x, y, obj in plan.objects[name]:
+            object_id += 1
+            if name == 'Trees':
+                obj_name, gid, width, height = obj
+            else:
+                obj_name, (gid, width, height) = None, obj
+            # tile objects are anchored at their bottom left corner
+            attributes = {'id': str(object_id), 'gid': str(gid), 'x': str(x), 'y': str(y + height),
+                          'width': str(width), 'height': str(height)}
+            if obj_name:
+                attributes['name'] = obj_name
+            ElementTree.SubElement(group, 'object', attributes)
+
+    layer_id += 1
+    group = ElementTree.SubElement(root, 'objectgroup', {'id': str(layer_id), 'name': 'Player'})
+    for name, x, y, size in plan.objects['Player']:
+        object_id += 1
+        attributes = {'id': str(object_id), 'name': name, 'x': str(x), 'y': str(y)}
+        if size:
+            attributes.update(width = str(size[0]), height = str(size[1]))
+        obj = ElementTree.SubElement(group, 'object', attributes)
+        if not size:
+            ElementTree.SubElement(obj, 'point')
+
+    root.set('nextlayerid', str(layer_id + 1))
+    root.set('nextobjectid', str(object_id + 1))
+    ElementTree.ElementTree(root).write(path, encoding = 'UTF-8', xml_declaration = True)
+
+def write_ground(path, plan, template, max_pixels):
+    # pieces in the streaming layout always, the single image only while it stays reasonably small
+    grass = template.tile_image(template.ground_gid)
+    water = plan.layers['Water']
+    size = STREAM_CHUNK_TILES * TILE_SIZE
+    folder = ground_chunk_folder(path, size)
+    os.makedirs(folder, exist_ok = True)
+
+    full_size = (plan.width * TILE_SIZE, plan.height * TILE_SIZE)
+    full = None
+    if full_size[0] * full_size[1] <= max_pixels:
+        full = pygame.Surface(full_size, pygame.SRCALPHA)
+
+    for chunk_y in range(math.ceil(plan.height / STREAM_CHUNK_TILES)):
+        for chunk_x in range(math.ceil(plan.width / STREAM_CHUNK_TILES)):
+            left, top = chunk_x * STREAM_CHUNK_TILES, chunk_y * STREAM_CHUNK_TILES
+            right = min(left + STREAM_CHUNK_TILES, plan.width)
+            bottom = min(top + STREAM_CHUNK_TILES, plan.height)
+            piece = pygame.Surface(((right - left) * TILE_SIZE, (bottom - top) * TILE_SIZE),
+                                   pygame.SRCALPHA)
+            piece.blits([(grass, ((col - left) * TILE_SIZE, (row - top) * TILE_SIZE))
+                         for row in range(top, bottom) for col in range(left, right)
+                         if not water[row * plan.width + col]], False)
+            pygame.image.save(piece, os.path.join(folder, f'{chunk_x}_{chunk_y}.png'))
+            if full:
+                full.blit(piece, (left * TILE_SIZE, top * TILE_SIZE))
+
+    if full:
+        pygame.image.save(full, path)
+    elif os.path.exists(path):
+        # a stale image would be split again over the fresh pieces
+        os.remove(path)
+    open(os.path.join(folder, GROUND_CHUNKS_MARKER), 'w').close()
+
+def farm_state(plan, template, planted, money):
+    # a save with `planted` tilled, watered and planted tiles on the generated fields
+    cells = bytearray(plan.width * plan.height)
+    farmable = [index for index, gid in enumerate(plan.layers['Farmable']) if gid]
+    for index in farmable:
+        cells[index] = FARMABLE
+    plants = []
+    plant_types = sorted(GROW_SPEED)
+    for number, index in enumerate(random.sample(farmable, min(planted, len(farmable)))):
+        cells[index] |= TILLED | WATERED | PLANTED
+        plants.append((index % plan.width, index // plan.width, plant_types[number % len(plant_types)],
+                       0, None))
+
+    trees = [(Tree.max_health, True, Tree.roll_fruit(obj[0])) for _, _, obj in plan.objects['Trees']]
+    return SaveState(money, {item: 0 for item in SALE_PRICES}, {seed: 5 for seed in PURCHASE_PRICES},
+                     [255, 255, 255], False, (plan.width, plan.height), cells, plants, trees)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Generate Farm Game maps and farms for scale tests')
+    parser.add_argument('output', help = 'folder for map.tmx, its ground and the optional save')
+    parser.add_argument('--width', type = int, help = 'map width in tiles')
+    parser.add_argument('--height', type = int, help = 'map height in tiles')
+    parser.add_argument('--scale', type = float, default = 1,
+                        help = 'area relative to the hand made map, used without --width/--height')
+    parser.add_argument('--farmable', type = float, default = 0.19, help = 'share of farmable tiles')
+    parser.add_argument('--collision', type = float, default = 0.08,
+                        help = 'share of blocked tiles, ponds included')
+    parser.add_argument('--water', type = float, default = 0.13, help = 'share of water tiles')
+    parser.add_argument('--trees', type = float, default = 0.015, help = 'trees per tile')
+    parser.add_argument('--decoration', type = float, default = 0.03, help = 'decorations per tile')
+    parser.add_argument('--planted', type = int, help = 'also write farm.sav with this many planted tiles')
+    parser.add_argument('--money', type = int, default = 200, help = 'money in the written save')
+    parser.add_argument('--max-ground-pixels', type = int, default = 64_000_000,
+                        help = 'largest ground.png written, bigger maps only get streaming pieces')
+    parser.add_argument('--seed', type = int, default = 1)
+    args = parser.parse_args()
+
+    template = Template(MAP_PATH)
+    if args.width and args.height:
+        width, height = args.width, args.height
+    else:
+        # same aspect as the hand made map
+        width = max(2 * START_CLEARING + 1, round(50 * math.sqrt(args.scale)))
+        height = max(2 * START_CLEARING + 1, round(40 * math.sqrt(args.scale)))
+
+    pygame.display.init()
+    random.seed(args.seed)
+    densities = {name: getattr(args, name) for name in ['farmable', 'collision', 'water', 'trees',
+                                                        'decoration']}
+    plan = generate(template, width, height, densities)
+
+    output = from_start_dir(args.output)
+    os.makedirs(output, exist_ok = True)
+    write_tmx(os.path.join(output, 'map.tmx'), plan, template, 'ground.png')
+    write_ground(os.path.join(output, 'ground.png'), plan, template, args.max_ground_pixels)
+    print(f'{width}x{height} map: {plan.count("Farmable")} farmable, {plan.count("Collision")} blocked, '
+          f'{plan.count("Water")} water, {len(plan.objects["Trees"])} trees, '
+          f'{len(plan.objects["Decoration"])} decorations')
+
+    if args.planted is not None:
+        state = farm_state(plan, template, args.planted, args.money)
+        write_save(os.path.join(output, 'farm.sav'), encode(state))
+        print(f'farm.sav: {len(state.plants)} planted tiles')
+
+if __name__ == '__main__':
+    main()